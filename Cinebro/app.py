@@ -5,79 +5,198 @@ import faiss
 import numpy as np
 import torch
 import streamlit as st
+from collections import Counter
 from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from splitter import make_splitter
+from result_cache import ResultCache, normalize_text, normalize_with_offsets, text_hash
+from index_store import current_index
+from rerank import Reranker, rerank_settings
 
 
 st.title("Script Similarity Finder")
 
-
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", device=device)
 
 
-index = faiss.read_index("text_chunks_faiss_300.index")
-with open("chunk_metadata_300.json", "r") as f:
-    metadata = json.load(f)
+@st.cache_resource
+def load_model():
+    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", device=device)
 
 
-splitter = RecursiveCharacterTextSplitter(
-    separators=["\n\n", "\n", "."],
-    chunk_size=300,
-    chunk_overlap=50,
-)
+@st.cache_resource(max_entries=2)
+def load_index(index_path, metadata_path, version):
+    # version is part of the cache key so a newly published index is reloaded
+    index = faiss.read_index(index_path)
+    with open(metadata_path, "r") as f:
+        metadata = json.load(f)
+    return index, metadata
 
-def is_generic(text):
-    
-    return (
-        len(text.strip()) < 30 or
-        re.match(r"^(INT\.|EXT\.|CUT TO|FADE IN|FADE OUT)", text.strip(), re.I)
-    )
 
-def find_most_similar_chunk(input_text):
-    input_chunks = splitter.split_text(input_text)
-    input_embeddings = model.encode(input_chunks, convert_to_numpy=True)
+@st.cache_resource
+def load_reranker(budget_ms):
+    return Reranker(budget_ms=budget_ms)
 
-    best_match = None
-    best_score = float('inf')
-    best_input_chunk = ""
 
-    for idx, emb in enumerate(input_embeddings):
-        chunk = input_chunks[idx]
-        if is_generic(chunk):
-            continue
+@st.cache_resource
+def load_result_cache():
+    return ResultCache(max_documents=64, max_chunks=50000)
 
-        D, I = index.search(np.array([emb]), k=1)
-        dist = D[0][0]
-        i = I[0][0]
 
-        if dist < 1.0 and dist < best_score:
-            match_chunk = chunk
-            matched_meta = metadata[i]
-            best_score = dist
-            best_match = matched_meta
-            best_input_chunk = match_chunk
+model = load_model()
+index_path, metadata_path, version = current_index()
+index, metadata = load_index(index_path, metadata_path, version)
+result_cache = load_result_cache()
+result_cache.ensure_version(version)
 
-    return best_match, best_input_chunk, best_score
+# Optional cross-encoder second stage (CINEBRO_RERANK=1); fixed per process so cached hits stay consistent
+rerank_enabled, rerank_k, rerank_budget_ms = rerank_settings()
+reranker = load_reranker(rerank_budget_ms) if rerank_enabled else None
 
 
-uploaded_file = st.file_uploader("📂 Upload a script file (.txt)", type=["txt"])
+splitter = make_splitter(model.tokenizer)
 
-if uploaded_file:
-    input_text = uploaded_file.read().decode("utf-8-sig", errors="ignore")
+def is_generic(text):
 
-    with st.spinner("Searching for similar scenes..."):
-        match, chunk_text, score = find_most_similar_chunk(input_text)
+    return (
+        len(text.strip()) < 30 or
+        re.match(r"^(INT\.|EXT\.|CUT TO|FADE IN|FADE OUT)", text.strip(), re.I)
+    )
 
+def search_chunks(chunks, rerank_deadline=None):
+    """Best corpus hit (distance, index id, rerank score) per chunk, only searching cache misses"""
+    hits, misses = result_cache.lookup_chunks(chunks)
+    if misses:
+        queries = [chunks[pos] for pos in misses]
+        embeddings = model.encode(queries, convert_to_numpy=True)
+        D, I = index.search(np.asarray(embeddings, dtype="float32"), k=rerank_k if reranker else 1)
+        incomplete = set()
+        if reranker:
+            # all (query, candidate) pairs of this batch go through one cross-encoder pass
+            found, incomplete = reranker.rerank(queries, D, I, metadata, rerank_deadline)
+        else:
+            found = [(float(D[row][0]), int(I[row][0]), None) for row in range(len(misses))]
+        for row, (pos, hit) in enumerate(zip(misses, found)):
+            # hits cut short by the rerank budget are not cached, so a later document reranks them
+            if row not in incomplete:
+                result_cache.put_chunk(chunks[pos], hit)
+            hits[pos] = hit
+    return [hits[pos] for pos in range(len(chunks))]
+
+def is_match(dist, rerank_score):
+    if reranker:
+        return reranker.is_match(dist, rerank_score)
+    return dist < 1.0
+
+def rank_key(dist, rerank_score):
+    # reranked hits order by cross-encoder score, the rest by L2 distance
+    return (0, -rerank_score) if rerank_score is not None else (1, dist)
+
+def iter_similar_chunks(input_text, first_window=16, max_window=256):
+    """
+    Search the script window by window, yielding the running best match and
+    per-film hit tallies after each one. Windows start small so the first
+    result shows up quickly, then double to keep encoder batches efficient.
+    """
+    text = normalize_text(input_text)
+    cached = result_cache.get_document(text)
+    if cached is not None:
+        yield cached + (1, 1)
+        return
+
+    pieces = [piece for piece in splitter.split_with_offsets(text) if not is_generic(piece[0])]
+
+    best = (None, "", float('inf'), None, None)
+    best_key = (2, 0.0)
+    # one rerank budget for the whole script, however many windows it takes
+    rerank_deadline = reranker.deadline() if reranker else None
+    tallies = Counter()
+    done, window = 0, first_window
+
+    while done < len(pieces):
+        batch = pieces[done:done + window]
+        for (chunk, start, end), (dist, i, rerank_score) in zip(batch, search_chunks([c for c, _, _ in batch], rerank_deadline)):
+            if is_match(dist, rerank_score):
+                tallies[metadata[i]['source']] += 1
+                if rank_key(dist, rerank_score) < best_key:
+                    best_key = rank_key(dist, rerank_score)
+                    best = (metadata[i], chunk, dist, (start, end), rerank_score)
+        done += len(batch)
+        window = min(window * 2, max_window)
+        yield best, tallies, done, len(pieces)
+
+    result_cache.put_document(text, (best, tallies))
+    if not pieces:
+        yield best, tallies, 0, 0
+
+def find_most_similar_chunk(input_text):
+    for best, tallies, done, total in iter_similar_chunks(input_text):
+        pass
+    return best, tallies
+
+def show_match(match, chunk_text, score, span, rerank_score=None, offsets=None):
+    # spans are found (and cached) in the normalized text; offsets map them back to the uploaded file
     if match:
+        if offsets is not None:
+            span = (offsets[span[0]], offsets[span[1] - 1] + 1)
         st.success("🎯 Closest Match Found")
         st.markdown(f"**Matched File:** `{match['source']}`")
         st.markdown(f"**Chunk Type:** `{match['chunk_type']}`")
         st.markdown(f"**Chunk ID:** `{match['chunk_id']}`")
         st.markdown(f"**Distance Score:** `{score:.4f}`")
+        if rerank_score is not None:
+            st.markdown(f"**Rerank Score:** `{rerank_score:.4f}`")
+        st.markdown(f"**Input Characters:** `{span[0]}–{span[1]}`")
 
         st.markdown("---")
         st.markdown("### 📌 Matched Snippet")
         st.code(chunk_text.strip())
     else:
         st.warning("No similar chunks found with meaningful content.")
+
+def show_tallies(tallies, limit=10):
+    if tallies:
+        st.markdown("### 🎞️ Matching Chunks per Film")
+        st.table([{"Film": source, "Chunks": count} for source, count in tallies.most_common(limit)])
+
+def cancel_search(doc_key):
+    st.session_state["cancelled_search"] = doc_key
+
+def resume_search():
+    st.session_state.pop("cancelled_search", None)
+
+
+uploaded_file = st.file_uploader("📂 Upload a script file (.txt)", type=["txt"])
+stream_results = st.toggle("Stream results while searching", value=True)
+
+if uploaded_file:
+    input_text = uploaded_file.read().decode("utf-8-sig", errors="ignore")
+    normalized_text, offsets = normalize_with_offsets(input_text)
+
+    if not stream_results:
+        with st.spinner("Searching for similar scenes..."):
+            best, tallies = find_most_similar_chunk(input_text)
+        show_match(*best, offsets=offsets)
+        show_tallies(tallies)
+    else:
+        doc_key = text_hash(normalized_text)
+        if st.session_state.get("cancelled_search") == doc_key:
+            st.info("Search stopped early; showing the partial result.")
+            # chunks searched before Stop are in the result cache, so resuming only searches the rest
+            st.button("▶️ Resume search", on_click=resume_search)
+            partial = st.session_state.get("partial_search", {})
+            if partial.get("key") == doc_key:
+                show_match(*partial["best"], offsets=offsets)
+                show_tallies(partial["tallies"])
+        else:
+            # Pressing Stop reruns the script, which abandons the in-flight search
+            st.button("⏹ Stop search", on_click=cancel_search, args=(doc_key,))
+            progress = st.progress(0.0)
+            match_box = st.empty()
+            tally_box = st.empty()
+            for best, tallies, done, total in iter_similar_chunks(input_text):
+                st.session_state["partial_search"] = {"key": doc_key, "best": best, "tallies": Counter(tallies)}
+                progress.progress(done / total if total else 1.0, text=f"Searched {done} of {total} chunks")
+                with match_box.container():
+                    show_match(*best, offsets=offsets)
+                with tally_box.container():
+                    show_tallies(tallies)
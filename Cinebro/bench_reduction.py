@@ -0,0 +1,55 @@
+import sys
+import time
+import faiss
+import numpy as np
+from reduction import build_index
+from index_store import current_index
+
+# --- DIMENSION / RECALL BENCHMARK ---
+# Uses the full-dimension index built by scr.py (CINEBRO_REDUCE_DIM unset) as
+# ground truth and reports recall, memory and search time for reduced indexes.
+DIMS = [32, 48, 64, 96, 128, 192, 256]
+NUM_QUERIES = 2000
+K = 10
+NOISE = 0.02  # perturb corpus vectors so queries resemble lightly edited drafts
+
+
+def recall_at(truth, found, k):
+    return float(np.mean([len(set(t[:k]) & set(f[:k])) / k for t, f in zip(truth, found)]))
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    D, I = index.search(queries, k)
+    return D, I, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main(method="pca"):
+    full = faiss.read_index(current_index()[0])
+    if isinstance(full, faiss.IndexPreTransform):
+        sys.exit("Benchmark needs the full-dimension index; rebuild scr.py without CINEBRO_REDUCE_DIM.")
+
+    vectors = full.reconstruct_n(0, full.ntotal)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(vectors), size=min(NUM_QUERIES, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, NOISE, size=(len(picks), vectors.shape[1])).astype("float32")
+
+    truth_D, truth_I, full_ms = timed_search(full, queries, K)
+    full_hits = (truth_D[:, 0] < 1.0)
+
+    print(f"{'dim':>5} {'recall@1':>9} {'recall@10':>10} {'<1.0 agree':>11} {'MB':>8} {'ms/query':>9}")
+    print(f"{vectors.shape[1]:>5} {1.0:>9.3f} {1.0:>10.3f} {1.0:>11.3f} {vectors.nbytes / 2**20:>8.1f} {full_ms:>9.3f}")
+
+    for dim in DIMS:
+        if dim >= vectors.shape[1]:
+            continue
+        index = build_index(vectors, dim, method)
+        D, I, ms = timed_search(index, queries, K)
+        # does the reduced index make the same accept/reject call at the 1.0 cutoff?
+        agree = float(np.mean((D[:, 0] < 1.0) == full_hits))
+        print(f"{dim:>5} {recall_at(truth_I, I, 1):>9.3f} {recall_at(truth_I, I, K):>10.3f} "
+              f"{agree:>11.3f} {index.ntotal * dim * 4 / 2**20:>8.1f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "pca")
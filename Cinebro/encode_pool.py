@@ -0,0 +1,62 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+_worker_model = None
+
+
+def encode_settings():
+    """(workers, threads per worker) from CINEBRO_ENCODE_WORKERS / CINEBRO_THREADS_PER_WORKER"""
+    workers = int(os.getenv("CINEBRO_ENCODE_WORKERS", "0"))
+    if workers <= 1:
+        return 0, 0
+    default_threads = max(1, (os.cpu_count() or 1) // workers)
+    return workers, int(os.getenv("CINEBRO_THREADS_PER_WORKER", str(default_threads)))
+
+
+# --- WORKER SIDE ---
+def _init_worker(model_name, threads):
+    # pin intra-op threads so workers x threads never exceeds the cores we have
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_batch(batch):
+    return _worker_model.encode(batch, convert_to_numpy=True, batch_size=64).astype("float32")
+
+
+# --- DRIVER SIDE ---
+def encode_parallel(chunks, workers, threads_per_worker, batch_size=512, model_name=MODEL_NAME):
+    """
+    Encode chunks across CPU worker processes, one model per worker.
+    Batches are handed out as workers free up, but results are written back in
+    chunk order so rows line up with the metadata list.
+    """
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+    embeddings = None
+    ctx = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(model_name, threads_per_worker),
+    ) as executor:
+        for n, batch_embeddings in enumerate(executor.map(_encode_batch, batches)):
+            start = n * batch_size
+            if embeddings is None:
+                embeddings = np.empty((len(chunks), batch_embeddings.shape[1]), dtype="float32")
+            embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+
+    if embeddings is None:
+        embeddings = np.empty((0, 384), dtype="float32")
+    return embeddings
@@ -0,0 +1,62 @@
+import os
+import json
+import glob
+import faiss
+from result_cache import index_version
+
+INDEX_PATH = "text_chunks_faiss_300.index"
+METADATA_PATH = "chunk_metadata_300.json"
+MANIFEST_PATH = "index_manifest.json"
+KEEP_VERSIONS = 2
+
+
+def current_index():
+    """
+    (index path, metadata path, version) of the live index. Published builds are
+    read from the manifest; otherwise fall back to the plain files written by
+    older builds, versioned by their mtime/size.
+    """
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r") as f:
+            manifest = json.load(f)
+        return manifest["index"], manifest["metadata"], str(manifest["version"])
+    return INDEX_PATH, METADATA_PATH, index_version(INDEX_PATH, METADATA_PATH)
+
+
+def publish_index(index, metadata):
+    """
+    Write a new index version next to the live one and switch the manifest to it
+    in one atomic rename, so readers never see an index and metadata pair from
+    different builds. Returns the new version number.
+    """
+    version = 1
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r") as f:
+            version = int(json.load(f)["version"]) + 1
+
+    stem_index, ext_index = os.path.splitext(INDEX_PATH)
+    stem_meta, ext_meta = os.path.splitext(METADATA_PATH)
+    index_path = f"{stem_index}.v{version}{ext_index}"
+    metadata_path = f"{stem_meta}.v{version}{ext_meta}"
+
+    faiss.write_index(index, index_path)
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "index": index_path, "metadata": metadata_path, "chunks": len(metadata)}, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+    _prune_versions(version)
+    return version
+
+
+def _prune_versions(version):
+    # keep the previous build around for apps that are still mid-load
+    for pattern in (INDEX_PATH, METADATA_PATH):
+        stem, ext = os.path.splitext(pattern)
+        for path in glob.glob(f"{glob.escape(stem)}.v*{ext}"):
+            number = path[len(stem) + 2:-len(ext)]
+            if number.isdigit() and int(number) <= version - KEEP_VERSIONS:
+                os.remove(path)
@@ -0,0 +1,40 @@
+import os
+import faiss
+import numpy as np
+
+
+def reduction_settings():
+    """(target dim, method) from CINEBRO_REDUCE_DIM / CINEBRO_REDUCE_METHOD; 0 keeps full 384-dim vectors"""
+    return int(os.getenv("CINEBRO_REDUCE_DIM", "0")), os.getenv("CINEBRO_REDUCE_METHOD", "pca").lower()
+
+
+def make_transform(dim, reduce_dim, method="pca"):
+    if method == "opq":
+        # OPQ rotation learned for 8 sub-spaces, then projected to reduce_dim
+        return faiss.OPQMatrix(dim, 8, reduce_dim)
+    if method == "pca":
+        return faiss.PCAMatrix(dim, reduce_dim)
+    raise ValueError(f"Unknown reduction method: {method}")
+
+
+def build_index(embeddings, reduce_dim=0, method="pca"):
+    """
+    Flat L2 index over the embeddings, optionally behind a learned PCA/OPQ stage.
+    The transform is trained here and saved inside the index file as an
+    IndexPreTransform, so full 384-dim queries are reduced automatically on search.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    dim = embeddings.shape[1]
+
+    if not reduce_dim or reduce_dim >= dim:
+        index = faiss.IndexFlatL2(dim)
+    else:
+        if method == "opq" and reduce_dim % 8:
+            raise ValueError(f"OPQ needs a target dimension divisible by 8, got {reduce_dim}")
+        transform = make_transform(dim, reduce_dim, method)
+        index = faiss.IndexPreTransform(transform, faiss.IndexFlatL2(reduce_dim))
+        index.train(embeddings)
+
+    index.add(embeddings)
+    return index
+
@@ -0,0 +1,73 @@
+import os
+import time
+from sentence_transformers import CrossEncoder
+
+RERANK_MODEL = "cross-encoder/stsb-TinyBERT-L-4"
+
+
+def rerank_settings():
+    """(enabled, top-k, latency budget ms per document) from CINEBRO_RERANK / CINEBRO_RERANK_K / CINEBRO_RERANK_BUDGET_MS"""
+    return (
+        os.getenv("CINEBRO_RERANK", "0") == "1",
+        int(os.getenv("CINEBRO_RERANK_K", "5")),
+        float(os.getenv("CINEBRO_RERANK_BUDGET_MS", "1500")),
+    )
+
+
+class Reranker:
+    """
+    Second retrieval stage: scores (input chunk, FAISS candidate) pairs with a
+    small STS cross-encoder on CPU. Only candidates inside max_distance are
+    considered, closest first, and the number of pairs is capped so the single
+    predict() call fits the latency budget at the measured per-pair cost. The
+    budget covers a whole document: calls for its later windows pass the same
+    deadline and only get the time that is left.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, budget_ms=1500, max_distance=1.2, threshold=0.8):
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.budget_ms = budget_ms
+        self.max_distance = max_distance
+        self.threshold = threshold
+        self.ms_per_pair = 2.0  # refined after every call
+
+    def deadline(self):
+        """perf_counter() time at which a document that starts now runs out of rerank budget"""
+        return time.perf_counter() + self.budget_ms / 1000
+
+    def rerank(self, queries, D, I, metadata, deadline=None):
+        """
+        Returns (results, incomplete): per query (distance, index id, rerank
+        score), and the set of queries that had candidates cut by the budget.
+        Queries none of whose candidates made it keep the bi-encoder top hit
+        with a score of None. Without a deadline the call gets the full budget.
+        """
+        budget_ms = self.budget_ms if deadline is None else (deadline - time.perf_counter()) * 1000
+        candidates = []
+        for q, (dists, ids) in enumerate(zip(D, I)):
+            for dist, i in zip(dists, ids):
+                if i >= 0 and dist < self.max_distance and "text" in metadata[i]:
+                    candidates.append((float(dist), q, int(i)))
+        candidates.sort()
+        kept = max(0, int(budget_ms / self.ms_per_pair))
+        incomplete = {q for _, q, _ in candidates[kept:]}
+        candidates = candidates[:kept]
+
+        results = [(float(D[q][0]), int(I[q][0]), None) for q in range(len(queries))]
+        if not candidates:
+            return results, incomplete
+
+        pairs = [(queries[q], metadata[i]["text"]) for _, q, i in candidates]
+        start = time.perf_counter()
+        scores = self.model.predict(pairs, batch_size=64, show_progress_bar=False)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.ms_per_pair = 0.7 * self.ms_per_pair + 0.3 * (elapsed_ms / len(pairs))
+
+        for (dist, q, i), score in zip(candidates, scores):
+            score = float(score)
+            if results[q][2] is None or score > results[q][2]:
+                results[q] = (dist, i, score)
+        return results, incomplete
+
+    def is_match(self, dist, score):
+        return score >= self.threshold if score is not None else dist < 1.0
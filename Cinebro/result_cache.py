@@ -0,0 +1,132 @@
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# --- NORMALIZATION AND KEYS ---
+def normalize_text(text):
+    """Normalize line endings and trailing whitespace so re-uploads hash the same"""
+    text = text.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def normalize_with_offsets(text):
+    """
+    normalize_text(text) plus, for each of its characters, the index of the
+    same character in text (with len(text) appended), so spans found in the
+    normalized script can be reported against the uploaded file.
+    """
+    chars, offsets = [], []
+    start = len(text) - len(text.lstrip("\ufeff"))
+    for line in re.finditer(r"([^\r\n]*)(\r\n|\r|\n)?", text[start:]):
+        content = line.group(1).rstrip()
+        chars.extend(content)
+        offsets.extend(range(start + line.start(1), start + line.start(1) + len(content)))
+        # blank runs collapse to one empty line, as in normalize_text
+        if line.group(2) and not (len(chars) >= 2 and chars[-1] == chars[-2] == "\n"):
+            chars.append("\n")
+            offsets.append(start + line.start(2))
+        if line.end() == len(text) - start:
+            break
+
+    first = next((i for i, c in enumerate(chars) if not c.isspace()), len(chars))
+    last = next((i for i in range(len(chars) - 1, -1, -1) if not chars[i].isspace()), first - 1)
+    return "".join(chars[first:last + 1]), offsets[first:last + 1] + [len(text)]
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_version(index_path, metadata_path=None):
+    """Cheap fingerprint of the index files on disk; changes whenever they are rewritten"""
+    parts = []
+    for path in (index_path, metadata_path):
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+    return text_hash("|".join(parts))[:16]
+
+
+class _LRU:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+# --- TWO-LEVEL RESULT CACHE ---
+class ResultCache:
+    """
+    Document-level results keyed by (normalized text hash, index version) and
+    per-chunk nearest-neighbour hits keyed by chunk hash. Both levels are bounded
+    LRUs and are dropped together when the index version changes.
+    """
+
+    def __init__(self, max_documents=64, max_chunks=50000):
+        self._documents = _LRU(max_documents)
+        self._chunks = _LRU(max_chunks)
+        self._lock = threading.Lock()
+        self.version = None
+        self.stats = {"document_hits": 0, "chunk_hits": 0, "chunk_misses": 0}
+
+    def ensure_version(self, version):
+        """Invalidate everything when a different index has been swapped in"""
+        with self._lock:
+            if version != self.version:
+                self._documents.clear()
+                self._chunks.clear()
+                self.version = version
+
+    def get_document(self, normalized_text):
+        with self._lock:
+            result = self._documents.get((text_hash(normalized_text), self.version))
+            if result is not None:
+                self.stats["document_hits"] += 1
+            return result
+
+    def put_document(self, normalized_text, result):
+        with self._lock:
+            self._documents.put((text_hash(normalized_text), self.version), result)
+
+    def lookup_chunks(self, chunks):
+        """Return ({position: hit}, [positions that still need a search])"""
+        hits, misses = {}, []
+        with self._lock:
+            for pos, chunk in enumerate(chunks):
+                hit = self._chunks.get(text_hash(chunk))
+                if hit is None:
+                    misses.append(pos)
+                else:
+                    hits[pos] = hit
+            self.stats["chunk_hits"] += len(hits)
+            self.stats["chunk_misses"] += len(misses)
+        return hits, misses
+
+    def put_chunk(self, chunk, hit):
+        with self._lock:
+            self._chunks.put(text_hash(chunk), hit)
+
+    def __len__(self):
+        return len(self._documents) + len(self._chunks)
@@ -5,33 +5,28 @@ import faiss
 import numpy as np
 import torch
 from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-# Check for GPU
-
-if torch.cuda.is_available():
-    print("✅ GPU is available:", torch.cuda.get_device_name(0))
-    device = "cuda"
-else:
-    print("❌ GPU is not available.")
-    device = "cpu"
-# Use a lighter model (e.g., all-MiniLM-L6-v2)
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", device=device)
-
-# Splitter
-splitter = RecursiveCharacterTextSplitter(
-    separators=["\n\n", "\n", "."],
-    chunk_size=300,  # Slightly larger for fuller context
-    chunk_overlap=50,
-)
+from splitter import make_splitter
+from reduction import build_index, reduction_settings
+from encode_pool import MODEL_NAME, encode_parallel, encode_settings
+from index_store import current_index, publish_index
 
 # Paths
-dataset = "C:\\Users\\GIRISHSAI RAJA\\Downloads\\Cinebro\\ds"
-chunk_list = []
-metadata = []
+dataset = os.getenv("CINEBRO_DATASET", "C:\\Users\\GIRISHSAI RAJA\\Downloads\\Cinebro\\ds")
+
+
+def load_model():
+    # Check for GPU
+    if torch.cuda.is_available():
+        print("✅ GPU is available:", torch.cuda.get_device_name(0))
+        device = "cuda"
+    else:
+        print("❌ GPU is not available.")
+        device = "cpu"
+    # Use a lighter model (e.g., all-MiniLM-L6-v2)
+    return SentenceTransformer(MODEL_NAME, device=device), device
 
 # --- PREPROCESS AND CHUNK EACH FILE ---
-def preprocess_and_chunk(file_path, file_name):
+def preprocess_and_chunk(file_path, file_name, splitter):
     dialogues = []
     descriptions = []
 
@@ -70,46 +65,61 @@ def preprocess_and_chunk(file_path, file_name):
     dialogue_chunks = splitter.split_text("\n\n".join(dialogues))
     description_chunks = splitter.split_text("\n\n".join(descriptions))
 
-    # Add to master lists
-    chunk_list.extend(dialogue_chunks)
-    chunk_list.extend(description_chunks)
-
     film_name = re.sub(r'(_\d+)?\.txt$', '', file_name)
 
-    metadata.extend([
-        {"source": file_name, "chunk_type": "dialogue", "chunk_id": i}
-        for i in range(len(dialogue_chunks))
+    # chunk text is kept for the cross-encoder rerank stage in app.py
+    chunk_meta = [
+        {"source": file_name, "chunk_type": "dialogue", "chunk_id": i, "text": chunk}
+        for i, chunk in enumerate(dialogue_chunks)
     ] + [
-        {"source": file_name, "chunk_type": "description", "chunk_id": i}
-        for i in range(len(description_chunks))
-    ])
+        {"source": file_name, "chunk_type": "description", "chunk_id": i, "text": chunk}
+        for i, chunk in enumerate(description_chunks)
+    ]
+    return dialogue_chunks + description_chunks, chunk_meta
+
+
+# --- EMBEDDING ---
+def encode_chunks(model, device, chunk_list):
+    # On CPU-only hosts CINEBRO_ENCODE_WORKERS=N spreads batches over N processes
+    workers, threads = encode_settings()
+    if device == "cpu" and workers:
+        print(f"🔄 Encoding all chunks with {workers} workers x {threads} threads...")
+        return encode_parallel(chunk_list, workers, threads)
+    print("🔄 Encoding all chunks...")
+    return model.encode(chunk_list, convert_to_numpy=True)
 
 
-# Loop through all dataset files
-for file_name in os.listdir(dataset):
-    if file_name.endswith(".txt"):
-        file_path = os.path.join(dataset, file_name)
-        preprocess_and_chunk(file_path, file_name)
+# --- INDEXING ---
+def build_corpus_index(model, device, splitter):
+    chunk_list = []
+    metadata = []
 
-# --- EMBEDDING AND INDEXING ---
-print("🔄 Encoding all chunks...")
-embeddings = model.encode(chunk_list, convert_to_numpy=True)
-dim = embeddings.shape[1]
+    # Loop through all dataset files
+    for file_name in sorted(os.listdir(dataset)):
+        if file_name.endswith(".txt"):
+            file_path = os.path.join(dataset, file_name)
+            chunks, chunk_meta = preprocess_and_chunk(file_path, file_name, splitter)
+            chunk_list.extend(chunks)
+            metadata.extend(chunk_meta)
 
-index = faiss.IndexFlatL2(dim)
-index.add(embeddings)
+    embeddings = encode_chunks(model, device, chunk_list)
 
-# Save index and metadata
-faiss.write_index(index, "text_chunks_faiss_300.index")
-with open("chunk_metadata_300.json", "w") as f:
-    json.dump(metadata, f, indent=2)
+    # Optional PCA/OPQ stage (CINEBRO_REDUCE_DIM=128 etc.), saved inside the index file
+    reduce_dim, reduce_method = reduction_settings()
+    index = build_index(embeddings, reduce_dim, reduce_method)
+    if reduce_dim:
+        print(f"📉 Reduced {embeddings.shape[1]} → {reduce_dim} dims with {reduce_method.upper()}")
 
-print("✅ Indexing completed. Total chunks:", len(chunk_list))
+    # Save index and metadata as a new published version
+    version = publish_index(index, metadata)
+
+    print(f"✅ Indexing completed (version {version}). Total chunks:", len(chunk_list))
 
 # --- INPUT SCRIPT QUERY FUNCTION ---
-def input_file(inputfile, splitter):
-    index = faiss.read_index("text_chunks_faiss_300.index")
-    with open("chunk_metadata_300.json", "r") as f:
+def input_file(inputfile, splitter, model):
+    index_path, metadata_path, _ = current_index()
+    index = faiss.read_index(index_path)
+    with open(metadata_path, "r") as f:
         metadata = json.load(f)
     with open(inputfile, "r", encoding="utf-8-sig", errors="ignore") as f:
         input_text = f.read()
@@ -133,5 +143,13 @@ def input_file(inputfile, splitter):
                 print("-" * 50)
 
 
-# --- RUN INPUT CHECK ---
-input_file("inputs\input3.txt", splitter=splitter)
+if __name__ == "__main__":
+    model, device = load_model()
+
+    # Splitter (300/50 characters, or a MiniLM token budget via CINEBRO_TOKEN_BUDGET)
+    splitter = make_splitter(model.tokenizer)
+
+    build_corpus_index(model, device, splitter)
+
+    # --- RUN INPUT CHECK ---
+    input_file("inputs\input3.txt", splitter=splitter, model=model)
@@ -0,0 +1,115 @@
+import os
+from bisect import bisect_left
+from collections import deque
+
+
+SEPARATORS = ["\n\n", "\n", "."]
+
+
+class ScriptSplitter:
+    """
+    Dependency-free replacement for LangChain's RecursiveCharacterTextSplitter.
+
+    Uses the same separator hierarchy and merge/overlap rules, but every chunk is
+    tracked as a (start, end) span into the source text. With a tokenizer, sizes
+    are budgeted in model tokens: the text is tokenized once and span lengths are
+    read off the offset mapping, so no chunk is ever re-tokenized.
+    """
+
+    def __init__(self, separators=None, chunk_size=300, chunk_overlap=50, tokenizer=None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.separators = list(separators or SEPARATORS)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer = tokenizer
+
+    def split_text(self, text):
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_with_offsets(self, text):
+        return [(text[start:end], start, end) for start, end in self.split_spans(text)]
+
+    def split_spans(self, text):
+        length = self._length_fn(text)
+        return self._split(text, 0, len(text), self.separators, length)
+
+    # --- INTERNALS ---
+    def _length_fn(self, text):
+        if self.tokenizer is None:
+            return lambda start, end: end - start
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        token_starts = [start for start, _ in encoding["offset_mapping"]]
+        return lambda start, end: bisect_left(token_starts, end) - bisect_left(token_starts, start)
+
+    def _split(self, text, start, end, separators, length):
+        separator, remaining = separators[-1], []
+        for i, candidate in enumerate(separators):
+            if text.find(candidate, start, end) != -1:
+                separator, remaining = candidate, separators[i + 1:]
+                break
+
+        chunks = []
+        good = []
+        for piece in self._pieces(text, start, end, separator):
+            if length(*piece) < self.chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                chunks.extend(self._merge(text, good, length))
+                good = []
+            if remaining:
+                chunks.extend(self._split(text, piece[0], piece[1], remaining, length))
+            else:
+                chunks.extend(self._strip(text, *piece))
+        if good:
+            chunks.extend(self._merge(text, good, length))
+        return chunks
+
+    @staticmethod
+    def _pieces(text, start, end, separator):
+        # separators stay attached to the start of the following piece, like keep_separator=True
+        piece_start = start
+        pos = text.find(separator, start + 1, end)
+        while pos != -1:
+            yield (piece_start, pos)
+            piece_start = pos
+            pos = text.find(separator, pos + len(separator), end)
+        if piece_start < end:
+            yield (piece_start, end)
+
+    def _merge(self, text, pieces, length):
+        chunks = []
+        current = deque()
+        total = 0
+        for piece in pieces:
+            piece_len = length(*piece)
+            if total + piece_len > self.chunk_size and current:
+                chunks.extend(self._strip(text, current[0][0], current[-1][1]))
+                while total > self.chunk_overlap or (total + piece_len > self.chunk_size and total > 0):
+                    total -= length(*current.popleft())
+            current.append(piece)
+            total += piece_len
+        if current:
+            chunks.extend(self._strip(text, current[0][0], current[-1][1]))
+        return chunks
+
+    @staticmethod
+    def _strip(text, start, end):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return [(start, end)] if start < end else []
+
+
+def make_splitter(tokenizer=None):
+    """
+    Splitter shared by scr.py and app.py so the index and queries are chunked alike.
+    Set CINEBRO_TOKEN_BUDGET (e.g. 128) to budget chunks in MiniLM tokens instead of
+    the default 300/50 characters; the index must be rebuilt after changing it.
+    """
+    token_budget = int(os.getenv("CINEBRO_TOKEN_BUDGET", "0"))
+    if token_budget and tokenizer is not None:
+        return ScriptSplitter(SEPARATORS, chunk_size=token_budget, chunk_overlap=token_budget // 6, tokenizer=tokenizer)
+    return ScriptSplitter(SEPARATORS, chunk_size=300, chunk_overlap=50)
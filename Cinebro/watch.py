@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import hashlib
+import faiss
+import numpy as np
+from scr import dataset, load_model, preprocess_and_chunk
+from splitter import make_splitter
+from reduction import build_index, reduction_settings
+from index_store import publish_index
+
+# --- WATCH MODE ---
+# Keeps the index live as screenplays land in ds/: each debounced burst of
+# added/modified/removed .txt files is re-chunked and re-embedded per file,
+# then a new index version is published for app.py to pick up on its next run.
+CACHE_DIR = "embedding_cache"
+CACHE_FORMAT = 2  # bump when the cached chunk metadata changes (v2: chunk "text" for reranking)
+POLL_SECONDS = 1.0
+DEBOUNCE_SECONDS = 3.0
+
+
+def scan(folder):
+    """{file name: (mtime, size)} for every script in the folder"""
+    snapshot = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".txt"):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+class IncrementalIndexer:
+    """Per-file chunk embeddings, cached on disk by content hash, splitter settings and cache format"""
+
+    def __init__(self, model, splitter, folder):
+        self.model = model
+        self.splitter = splitter
+        self.folder = folder
+        self.files = {}  # file name -> (embeddings, metadata)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+    def _cache_path(self, digest):
+        mode = "tok" if self.splitter.tokenizer is not None else "chr"
+        return os.path.join(CACHE_DIR, f"{digest}_{mode}{self.splitter.chunk_size}_{self.splitter.chunk_overlap}_v{CACHE_FORMAT}.npz")
+
+    def _embed_file(self, file_name):
+        file_path = os.path.join(self.folder, file_name)
+        with open(file_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        cache_path = self._cache_path(digest)
+        if os.path.exists(cache_path):
+            cached = np.load(cache_path)
+            return cached["embeddings"], json.loads(str(cached["metadata"]))
+
+        chunks, chunk_meta = preprocess_and_chunk(file_path, file_name, self.splitter)
+        embeddings = self.model.encode(chunks, convert_to_numpy=True).astype("float32") if chunks \
+            else np.empty((0, self.model.get_sentence_embedding_dimension()), dtype="float32")
+        np.savez(cache_path, embeddings=embeddings, metadata=np.array(json.dumps(chunk_meta)))
+        return embeddings, chunk_meta
+
+    def update(self, changed, removed):
+        for file_name in sorted(changed):
+            try:
+                self.files[file_name] = self._embed_file(file_name)
+            except FileNotFoundError:
+                removed = set(removed) | {file_name}
+        for file_name in removed:
+            self.files.pop(file_name, None)
+
+    def publish(self):
+        names = sorted(self.files)
+        metadata = [meta for name in names for meta in self.files[name][1]]
+        if not metadata:
+            # every script is gone: publish an empty index so the app stops serving removed ones
+            return publish_index(faiss.IndexFlatL2(self.model.get_sentence_embedding_dimension()), metadata)
+
+        embeddings = np.concatenate([self.files[name][0] for name in names])
+        reduce_dim, reduce_method = reduction_settings()
+        index = build_index(embeddings, reduce_dim, reduce_method)
+        return publish_index(index, metadata)
+
+
+def watch(folder=dataset, poll_seconds=POLL_SECONDS, debounce_seconds=DEBOUNCE_SECONDS):
+    model, _ = load_model()
+    splitter = make_splitter(model.tokenizer)
+    indexer = IncrementalIndexer(model, splitter, folder)
+
+    known = {}
+    changed, removed = set(), set()
+    last_event = 0.0
+    print(f"👀 Watching {folder} for screenplay changes...")
+
+    while True:
+        snapshot = scan(folder)
+        for name, signature in snapshot.items():
+            if known.get(name) != signature:
+                changed.add(name)
+                removed.discard(name)
+                last_event = time.monotonic()
+        for name in known.keys() - snapshot.keys():
+            removed.add(name)
+            changed.discard(name)
+            last_event = time.monotonic()
+        known = snapshot
+
+        # wait for the burst to settle before re-indexing
+        if (changed or removed) and time.monotonic() - last_event >= debounce_seconds:
+            print(f"🔄 Re-indexing: {len(changed)} added/modified, {len(removed)} removed")
+            indexer.update(changed, removed)
+            version = indexer.publish()
+            print(f"✅ Published index version {version} ({len(indexer.files)} scripts)")
+            changed, removed = set(), set()
+
+        time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    watch()
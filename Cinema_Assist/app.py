@@ -1,6 +1,7 @@
 import streamlit as st
 import google.generativeai as genai
 from utilities import generate_pdf
+from shot_cache import ShotCache
 import json
 import re
 import pandas as pd
@@ -345,10 +346,33 @@ with col2:
 
 # Gemini API key
 GEMINI_API_KEY = ""
+SHOT_MODEL = "models/gemini-2.5-pro"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+@st.cache_resource
+def get_shot_cache():
+    # shared by every session; persisted next to the app (SHOT_CACHE_PATH to move it)
+    return ShotCache()
+
+def embed_description(text):
+    return genai.embed_content(model=EMBEDDING_MODEL, content=text, task_type="semantic_similarity")["embedding"]
 
 def get_shot_recommendations(scene_description, api_key):
+    """
+    Shot list for a scene. Repeated scenes (same text after normalization) and
+    near-identical ones (embedding similarity above the cache threshold) are
+    served from the shot cache instead of calling Gemini again.
+    """
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("models/gemini-2.5-pro")
+    return get_shot_cache().get_or_generate(
+        scene_description,
+        lambda: generate_shot_recommendations(scene_description),
+        embed=embed_description,
+        namespace=SHOT_MODEL,
+    )
+
+def generate_shot_recommendations(scene_description):
+    model = genai.GenerativeModel(SHOT_MODEL)
     
     prompt = (
         "You are an expert cinematographer with knowledge of film school techniques and famous film breakdowns. "
@@ -401,17 +425,9 @@ if generate_button:
     else:
         # Show loading animation
         with st.spinner("🎭 Analyzing your scene and generating recommendations..."):
-            progress_bar = st.progress(0)
-            for i in range(100):
-                time.sleep(0.01)
-                progress_bar.progress(i + 1)
-            
             try:
                 shot_list = get_shot_recommendations(scene_description, GEMINI_API_KEY)
                 
-                # Clear progress bar
-                progress_bar.empty()
-                
                 # Display scene info
                 st.markdown("---")
                 st.markdown(f"""
@@ -483,6 +499,20 @@ if generate_button:
                 st.error(f"❌ Error generating shot list: {str(e)}")
                 st.info("💡 Please try again or check your scene description.")
 
+# Shot cache metrics (rendered after generation so they include this run)
+with st.sidebar:
+    st.markdown("### ⚡ Shot Cache")
+    shot_cache = get_shot_cache()
+    cache_col_a, cache_col_b = st.columns(2)
+    with cache_col_a:
+        st.metric("Hit Rate", f"{shot_cache.hit_rate():.0%}")
+    with cache_col_b:
+        st.metric("Cached Scenes", len(shot_cache))
+    st.caption(
+        f"Exact hits: {shot_cache.stats['exact_hits']} · Similar-scene hits: {shot_cache.stats['semantic_hits']} · "
+        f"Misses: {shot_cache.stats['misses']}"
+    )
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,145 @@
+# shot_cache.py
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+CACHE_PATH = os.getenv("SHOT_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "shot_cache.sqlite3"))
+SIMILARITY_THRESHOLD = float(os.getenv("SHOT_CACHE_SIMILARITY", "0.93"))
+TTL_SECONDS = float(os.getenv("SHOT_CACHE_TTL_HOURS", "168")) * 3600
+MAX_ENTRIES = int(os.getenv("SHOT_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_description(text):
+    """Case, whitespace and trailing punctuation do not change the shot list"""
+    return re.sub(r"\s+", " ", text).strip().strip(".!?,;:").strip().lower()
+
+
+class ShotCache:
+    """
+    Two-tier cache for shot lists. The exact tier is keyed by a hash of the
+    normalized scene description (plus a namespace such as the model name);
+    the semantic tier compares the description's embedding with those of past
+    scenes and reuses a shot list above the similarity threshold. Entries
+    live in SQLite, expire after a TTL and are evicted least recently used.
+    """
+
+    def __init__(self, path=CACHE_PATH, threshold=SIMILARITY_THRESHOLD, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shots (key TEXT PRIMARY KEY, namespace TEXT, description TEXT, "
+            "embedding BLOB, response TEXT, created REAL, last_used REAL)"
+        )
+        self._db.commit()
+        self._vectors = None  # (namespace, keys, normalized embedding matrix) for the semantic tier, rebuilt on change
+
+    # ---- Lookups ----
+    def key(self, description, namespace=""):
+        return hashlib.sha256(f"{namespace}\n{normalize_description(description)}".encode("utf-8")).hexdigest()
+
+    def _fresh_response(self, key):
+        """Stored shot list for key if it has not expired; marks it as recently used"""
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM shots WHERE key = ?", (key,)).fetchone()
+            if not row or time.time() - row[1] > self.ttl:
+                return None
+            self._db.execute("UPDATE shots SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def get_exact(self, description, namespace=""):
+        return self._fresh_response(self.key(description, namespace))
+
+    def get_similar(self, embedding, namespace=""):
+        """(shot list, similarity) of the closest past scene above the threshold, else (None, best similarity)"""
+        keys, matrix = self._load_vectors(namespace)
+        if not keys:
+            return None, 0.0
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None, float(similarities[best])
+        return self._fresh_response(keys[best]), float(similarities[best])
+
+    def get_or_generate(self, description, generate, embed=None, namespace=""):
+        """
+        Cached shot list for description, or generate() on a miss. embed(text)
+        returns an embedding vector for the semantic tier; without it (or if it
+        fails) only exact matches are reused.
+        """
+        cached = self.get_exact(description, namespace)
+        if cached is not None:
+            self._count("exact_hits")
+            return cached
+
+        embedding = None
+        if embed is not None:
+            try:
+                embedding = np.asarray(embed(normalize_description(description)), dtype=np.float32)
+                cached, _ = self.get_similar(embedding, namespace)
+                if cached is not None:
+                    self._count("semantic_hits")
+                    return cached
+            except Exception as e:
+                print(f"[Shot Cache] Semantic lookup skipped: {e}")
+
+        self._count("misses")
+        response = generate()
+        self.put(description, response, embedding, namespace)
+        return response
+
+    # ---- Storage ----
+    def put(self, description, response, embedding=None, namespace=""):
+        now = time.time()
+        blob = None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO shots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(description, namespace), namespace, description, blob, json.dumps(response), now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+            self._vectors = None
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM shots WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM shots WHERE key NOT IN (SELECT key FROM shots ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def _load_vectors(self, namespace):
+        with self._lock:
+            if self._vectors is None or self._vectors[0] != namespace:
+                rows = self._db.execute(
+                    "SELECT key, embedding FROM shots WHERE namespace = ? AND embedding IS NOT NULL", (namespace,)
+                ).fetchall()
+                keys = [key for key, _ in rows]
+                matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else np.empty((0, 0), dtype=np.float32)
+                if rows:
+                    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._vectors = (namespace, keys, matrix)
+            return self._vectors[1], self._vectors[2]
+
+    # ---- Metrics ----
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        return (self.stats["exact_hits"] + self.stats["semantic_hits"]) / total if total else 0.0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM shots").fetchone()[0]
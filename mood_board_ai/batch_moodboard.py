@@ -0,0 +1,238 @@
+# batch_moodboard.py
+#
+# Bulk analysis of a folder of location/costume stills: dominant palette,
+# palette-matched themes and CLIP themes per image, written to report.csv
+# (plus report.parquet when pandas/pyarrow are installed) and one contact
+# sheet per CLIP theme. Rows are appended after every batch, so an interrupted
+# run resumes where it stopped; unchanged stills are never re-analysed. A run
+# that finishes rewrites report.csv with one row per still that still exists.
+# Usage: python batch_moodboard.py path/to/stills path/to/output [--no-clip] [--gemini]
+
+import os
+import sys
+import csv
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from prompt_analysis.color_extraction import extract_palette
+from prompt_analysis.dedup_index import DedupIndex, phash, tone_signature, format_tones, parse_tones
+from prompt_analysis.image_ingest import DECODE_SIZE, decode_image
+from prompt_analysis.recommend_color import load_theme_data, guess_themes_from_colors_batch
+from prompt_analysis.reference_library import iter_image_paths, thumbnail_name
+
+THUMB_SIZE = 160
+SHEET_COLUMNS = 8
+SHEET_MAX_STILLS = 64
+TOP_K = 3
+
+ANALYSIS_FIELDS = ["colors", "weights"]
+ANALYSIS_FIELDS += [f"palette_theme_{i}" for i in range(1, TOP_K + 1)] + [f"palette_score_{i}" for i in range(1, TOP_K + 1)]
+ANALYSIS_FIELDS += [f"clip_theme_{i}" for i in range(1, TOP_K + 1)] + [f"clip_score_{i}" for i in range(1, TOP_K + 1)]
+FIELDS = ["path", "mtime", "width", "height", "phash", "tones", "duplicate_of"] + ANALYSIS_FIELDS
+# typed columns in report.parquet; resumed rows come back from the CSV as strings
+NUMERIC_FIELDS = ["mtime", "width", "height"]
+NUMERIC_FIELDS += [f"palette_score_{i}" for i in range(1, TOP_K + 1)] + [f"clip_score_{i}" for i in range(1, TOP_K + 1)]
+
+
+def decode_still(path: str):
+    """
+    Decode near DECODE_SIZE (JPEG draft mode), so large stills never
+    materialize at full size. Returns (image, original size) or None if the
+    file is unreadable.
+    """
+    try:
+        image = Image.open(path)
+        size = image.size
+        return decode_image(image, DECODE_SIZE), size
+    except Exception as e:
+        print(f"[Batch] Skipping {path}: {e}")
+        return None
+
+
+def read_report(report_path: str) -> dict:
+    """
+    Existing rows by path, last row wins (a modified still is appended again).
+    A report written with older columns is rewritten with the current ones.
+    """
+    if not os.path.exists(report_path):
+        return {}
+    with open(report_path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        rows = {row["path"]: row for row in reader}
+        columns = reader.fieldnames
+    if columns != FIELDS:
+        with open(report_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, restval="", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows.values())
+    return rows
+
+
+def write_report(rows: list, report_path: str):
+    """Rewrite report.csv with one row per still (the appended log may hold stale and duplicate rows)"""
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, restval="", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, report_path)
+
+
+def analyse_batch(paths, pool, theme_data, thumb_dir, use_clip, use_gemini=False, dedup=None, done=None):
+    """
+    Rows for one batch of stills. With a dedup index, a still whose perceptual
+    hash and tones are near an already analysed one copies that row's analysis
+    (recorded in duplicate_of) instead of running palette, Gemini and CLIP again.
+    A regraded copy of a frame has different tones and is analysed on its own.
+    """
+    decoded = [(path, item) for path, item in zip(paths, pool.map(decode_still, paths)) if item]
+    if not decoded:
+        return []
+
+    rows = {}
+    originals, duplicates = [], []
+    signatures = pool.map(lambda item: (phash(item[1][0]), tone_signature(item[1][0])), decoded)
+    for (path, (image, size)), (item_hash, tones) in zip(decoded, signatures):
+        thumbnail = image.copy()
+        thumbnail.thumbnail((THUMB_SIZE, THUMB_SIZE))
+        thumbnail.save(os.path.join(thumb_dir, thumbnail_name(path)), "JPEG", quality=85)
+        rows[path] = {
+            "path": path, "mtime": os.path.getmtime(path), "width": size[0], "height": size[1],
+            "phash": f"{item_hash:016x}", "tones": format_tones(tones), "duplicate_of": "",
+        }
+
+        matches = [key for _, key in dedup.find(item_hash, tones) if key != path] if dedup is not None else []
+        if matches:
+            duplicates.append((path, matches[0]))
+        else:
+            originals.append((path, image))
+            if dedup is not None:
+                dedup.add(item_hash, path, tones)
+
+    if originals:
+        palettes = list(pool.map(lambda item: extract_palette(item[1]), originals))
+        # with use_gemini every still's shortlist is reranked by concurrent Gemini calls
+        palette_themes = guess_themes_from_colors_batch(
+            [colors for colors, _ in palettes], theme_data, use_gemini, weights=[weights for _, weights in palettes]
+        )
+        for (path, _), (colors, weights), matches in zip(originals, palettes, palette_themes):
+            row = rows[path]
+            row["colors"], row["weights"] = " ".join(colors), " ".join(f"{w:.3f}" for w in weights)
+            for i, match in enumerate(matches[:TOP_K], 1):
+                row[f"palette_theme_{i}"], row[f"palette_score_{i}"] = match["theme"], match["score"]
+
+    if use_clip and originals:
+        from prompt_analysis.classify_prompt import classify_loaded_images
+
+        themes, scores = classify_loaded_images([image for _, image in originals], len(originals), TOP_K)
+        for (path, _), row_themes, row_scores in zip(originals, themes, scores):
+            for i, (theme, score) in enumerate(zip(row_themes, row_scores), 1):
+                rows[path][f"clip_theme_{i}"], rows[path][f"clip_score_{i}"] = theme, round(float(score), 3)
+
+    for path, source_path in duplicates:
+        source = rows.get(source_path) or done[source_path]
+        copied = {field: source.get(field, "") for field in ANALYSIS_FIELDS}
+        rows[path].update(copied, duplicate_of=source.get("duplicate_of") or source_path)
+    return list(rows.values())
+
+
+def write_contact_sheets(rows: list, thumb_dir: str, sheet_dir: str, theme_field: str) -> int:
+    """One grid of thumbnails per theme, best-scoring stills first"""
+    by_theme = defaultdict(list)
+    score_field = theme_field.replace("theme", "score")
+    for row in rows:
+        if row.get(theme_field):
+            by_theme[row[theme_field]].append(row)
+
+    os.makedirs(sheet_dir, exist_ok=True)
+    for theme, theme_rows in by_theme.items():
+        theme_rows = sorted(theme_rows, key=lambda r: -float(r.get(score_field) or 0))[:SHEET_MAX_STILLS]
+        columns = min(SHEET_COLUMNS, len(theme_rows))
+        sheet_rows = (len(theme_rows) + columns - 1) // columns
+        sheet = Image.new("RGB", (columns * THUMB_SIZE, sheet_rows * THUMB_SIZE), (24, 24, 24))
+        for n, row in enumerate(theme_rows):
+            thumb_path = os.path.join(thumb_dir, thumbnail_name(row["path"]))
+            if not os.path.exists(thumb_path):
+                continue
+            with Image.open(thumb_path) as thumb:
+                x = (n % columns) * THUMB_SIZE + (THUMB_SIZE - thumb.width) // 2
+                y = (n // columns) * THUMB_SIZE + (THUMB_SIZE - thumb.height) // 2
+                sheet.paste(thumb, (x, y))
+        sheet.save(os.path.join(sheet_dir, f"{theme}.jpg"), "JPEG", quality=88)
+    return len(by_theme)
+
+
+def write_parquet(rows: list, parquet_path: str):
+    try:
+        import pandas as pd
+
+        frame = pd.DataFrame(rows, columns=FIELDS)
+        for field in NUMERIC_FIELDS:
+            frame[field] = pd.to_numeric(frame[field], errors="coerce")
+        text_fields = [field for field in FIELDS if field not in NUMERIC_FIELDS]
+        frame[text_fields] = frame[text_fields].fillna("").astype(str)
+        frame.to_parquet(parquet_path, index=False)
+    except ImportError:
+        print("[Batch] pandas/pyarrow not installed; report.csv only")
+
+
+def main(folder, output_dir, batch_size=64, workers=8, use_clip=True, use_gemini=False, dedup=True):
+    thumb_dir = os.path.join(output_dir, "thumbs")
+    os.makedirs(thumb_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "report.csv")
+    theme_data = load_theme_data()
+
+    done = read_report(report_path)
+    todo = [
+        path for path in iter_image_paths(folder)
+        if path not in done or float(done[path]["mtime"]) != os.path.getmtime(path)
+    ]
+    print(f"[Batch] {len(done)} stills already in report, {len(todo)} to analyse")
+
+    dedup_index = DedupIndex() if dedup else None
+    if dedup_index is not None:
+        stale = set(todo)
+        for path, row in done.items():
+            tones = parse_tones(row.get("tones"))
+            # only analysed originals whose file is unchanged are reuse sources; rows from before tones were recorded are not
+            if row.get("phash") and tones is not None and not row.get("duplicate_of") and path not in stale and os.path.exists(path):
+                dedup_index.add(int(row["phash"], 16), path, tones)
+
+    new_file = not os.path.exists(report_path)
+    with open(report_path, "a", newline="", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+        for start in range(0, len(todo), batch_size):
+            rows = analyse_batch(
+                todo[start:start + batch_size], pool, theme_data, thumb_dir, use_clip, use_gemini, dedup_index, done
+            )
+            writer.writerows(rows)
+            f.flush()
+            done.update((row["path"], row) for row in rows)
+            print(f"[Batch] {min(start + batch_size, len(todo))}/{len(todo)}")
+
+    # modified stills were appended again and deleted ones are still listed; keep one row per existing still
+    rows = [row for path, row in done.items() if os.path.exists(path)]
+    write_report(rows, report_path)
+    write_parquet(rows, os.path.join(output_dir, "report.parquet"))
+    theme_field = "clip_theme_1" if use_clip else "palette_theme_1"
+    sheets = write_contact_sheets(rows, thumb_dir, os.path.join(output_dir, "contact_sheets"), theme_field)
+    duplicates = sum(1 for row in rows if row.get("duplicate_of"))
+    print(f"[Batch] {len(rows)} stills in report ({duplicates} near-duplicates reused), {sheets} contact sheets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch theme/palette report for a folder of stills")
+    parser.add_argument("folder")
+    parser.add_argument("output_dir")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-clip", action="store_true", help="palette themes only, skip CLIP")
+    parser.add_argument("--gemini", action="store_true", help="rerank each palette shortlist with Gemini")
+    parser.add_argument("--no-dedup", action="store_true", help="analyse near-duplicate stills separately")
+    args = parser.parse_args()
+    if not os.path.isdir(args.folder):
+        sys.exit(f"Not a folder: {args.folder}")
+    main(args.folder, args.output_dir, args.batch_size, args.workers, not args.no_clip, args.gemini, not args.no_dedup)
@@ -0,0 +1,126 @@
+# bench_clip_quantization.py
+#
+# Accuracy and latency of the int8 (dynamic-quantized) CLIP backend against
+# FP32 on CPU: top-1 theme agreement on a fixed prompt set and, optionally, a
+# folder of stills. Enable the backend in the app with MOODBOARD_CLIP_BACKEND=int8
+# once agreement is acceptable for your theme map.
+# Usage: python bench_clip_quantization.py [path/to/stills] [num_images]
+
+import sys
+import time
+import torch
+import clip
+import numpy as np
+from PIL import Image
+from prompt_analysis.classify_prompt import load_clip, load_labels, device
+from prompt_analysis.reference_library import iter_image_paths
+
+PROMPTS = [
+    "A mysterious figure walking through a foggy Victorian street at midnight, gas lamps casting eerie shadows",
+    "Bright summer festival with colorful decorations and joyful crowds dancing",
+    "Futuristic cyberpunk cityscape with neon lights reflecting on wet streets",
+    "Soldiers crouched in a muddy trench as shells explode overhead",
+    "Two lovers sharing a candlelit dinner on a balcony",
+    "A lone rider crossing endless sand dunes under a blazing sun",
+    "Sunlight filtering through tall pines onto a mossy forest floor",
+    "Kids building sandcastles as waves roll onto a tropical shore",
+    "A cabin buried in snow with smoke curling from the chimney",
+    "A detective in a trench coat under a flickering streetlight, rain pouring",
+    "An astronaut floating past a space station window above Earth",
+    "A queen entering a golden throne room lined with guards",
+    "Pirates boarding a merchant ship in a storm",
+    "A crowded night market full of food stalls and lanterns",
+    "Commuters packed into a graffiti-covered subway car",
+    "A crew of thieves cracking a bank vault",
+    "Clowns and acrobats performing under a striped big top",
+    "An abandoned mansion with creaking doors and ghostly whispers",
+    "Knights feasting in a torch-lit castle hall",
+    "Orange leaves drifting over a quiet country road in autumn",
+    "A diver exploring a coral reef full of fish",
+    "A ruined city under a toxic sky where survivors scavenge",
+    "Rolling green farmland with a red barn at dawn",
+    "A nurse walking down a sterile hospital corridor at night",
+]
+
+
+def label_features(model, labels):
+    tokens = torch.cat([clip.tokenize(f"This is a {label} scene") for label in labels]).to(device)
+    with torch.no_grad():
+        features = model.encode_text(tokens)
+    return features / features.norm(dim=-1, keepdim=True)
+
+
+def top1_prompts(model, labels_feat):
+    with torch.no_grad():
+        features = model.encode_text(clip.tokenize(PROMPTS, truncate=True).to(device))
+        features /= features.norm(dim=-1, keepdim=True)
+    return (features @ labels_feat.T).argmax(dim=-1).cpu().numpy()
+
+
+def top1_images(model, labels_feat, images):
+    with torch.no_grad():
+        features = model.encode_image(images)
+        features /= features.norm(dim=-1, keepdim=True)
+    return (features @ labels_feat.T).argmax(dim=-1).cpu().numpy()
+
+
+def timed(fn, *args, repeats=3):
+    fn(*args)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000 / repeats
+
+
+def weight_mb(model):
+    buffer = 0
+    for name, tensor in model.state_dict().items():
+        if isinstance(tensor, torch.Tensor):
+            buffer += tensor.numel() * tensor.element_size()
+        elif isinstance(tensor, tuple):  # packed quantized Linear params
+            buffer += sum(t.numel() * t.element_size() for t in tensor if isinstance(t, torch.Tensor))
+    return buffer / 1e6
+
+
+def main(folder=None, limit=64):
+    if device != "cpu":
+        sys.exit("The int8 backend only applies on CPU; run with CUDA_VISIBLE_DEVICES= to compare.")
+    labels = load_labels()
+    backends = {name: load_clip(name) for name in ("fp32", "int8")}
+    preprocess = backends["fp32"][1]
+
+    images = None
+    if folder:
+        paths = list(iter_image_paths(folder))[:limit]
+        if not paths:
+            sys.exit(f"No images found in {folder}")
+        images = torch.stack([preprocess(Image.open(path)) for path in paths]).to(device)
+
+    results = {}
+    for name, (model, _) in backends.items():
+        labels_feat = label_features(model, labels)
+        prompt_top1, prompt_ms = timed(top1_prompts, model, labels_feat)
+        row = {"prompts": prompt_top1, "prompt_ms": prompt_ms, "mb": weight_mb(model)}
+        if images is not None:
+            row["images"], row["image_ms"] = timed(top1_images, model, labels_feat, images, repeats=1)
+        results[name] = row
+
+    reference, quantized = results["fp32"], results["int8"]
+    print(f"{'backend':>8} {'weights MB':>11} {'prompt ms':>10}" + (f" {'image ms':>9}" if images is not None else ""))
+    for name, row in results.items():
+        line = f"{name:>8} {row['mb']:>11.1f} {row['prompt_ms']:>10.1f}"
+        if images is not None:
+            line += f" {row['image_ms']:>9.1f}"
+        print(line)
+
+    agreement = np.mean(reference["prompts"] == quantized["prompts"])
+    print(f"\nTop-1 theme agreement, {len(PROMPTS)} prompts: {agreement:.0%}")
+    if images is not None:
+        print(f"Top-1 theme agreement, {len(images)} images: {np.mean(reference['images'] == quantized['images']):.0%}")
+    for prompt, a, b in zip(PROMPTS, reference["prompts"], quantized["prompts"]):
+        if a != b:
+            print(f"  differs: {labels[a]} -> {labels[b]}  ({prompt[:60]})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 64)
@@ -0,0 +1,48 @@
+# bench_color_extraction.py
+#
+# Latency of each dominant-color method and its palette distance (mean ΔE76
+# under the best one-to-one color assignment) to the reference full KMeans.
+# Usage: python bench_color_extraction.py path/to/stills [num_images]
+
+import os
+import sys
+import time
+import numpy as np
+from prompt_analysis.color_extraction import extract_palette, METHODS
+from prompt_analysis.recommend_color import hex_to_rgb, rgb_to_lab, palette_distances
+
+TOLERANCE_DELTA_E = 10.0
+
+
+def main(folder, limit=50):
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    )[:limit]
+    if not paths:
+        sys.exit(f"No images found in {folder}")
+
+    timings = {method: [] for method in METHODS}
+    palettes = {method: [] for method in METHODS}
+    for path in paths:
+        for method in METHODS:
+            start = time.perf_counter()
+            colors, _ = extract_palette(path, 5, method)
+            timings[method].append((time.perf_counter() - start) * 1000)
+            palettes[method].append(colors)
+
+    reference_ms = np.median(timings["kmeans"])
+    print(f"{'method':>11} {'median ms':>10} {'speedup':>8} {'mean ΔE':>8} {'max ΔE':>7} {'in tol':>7}")
+    for method in METHODS:
+        distances = []
+        for colors, reference in zip(palettes[method], palettes["kmeans"]):
+            theme_lab = rgb_to_lab(hex_to_rgb(reference))[None]
+            distances.append(float(palette_distances(rgb_to_lab(hex_to_rgb(colors)), theme_lab)[0]))
+        ms = np.median(timings[method])
+        within = np.mean(np.array(distances) <= TOLERANCE_DELTA_E)
+        print(f"{method:>11} {ms:>10.2f} {reference_ms / ms:>7.1f}x {np.mean(distances):>8.2f} "
+              f"{np.max(distances):>7.2f} {within:>7.0%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 50)
@@ -0,0 +1,52 @@
+# check_keyword_ranking.py
+#
+# Sanity checks for the local keyword ranking (the default Text Prompt path):
+# stopwords never become terms, inflections meet their keywords, and the
+# README's example prompts rank the expected themes near the top.
+# Usage: python check_keyword_ranking.py
+
+import sys
+from prompt_analysis.keyword_index import lemmatize, terms
+from prompt_analysis.theme_catalogue import get_catalogue
+
+SAME_STEM = [("dance", "dancing"), ("dance", "danced"), ("dance", "dances"), ("make", "making"), ("run", "running"), ("city", "cities")]
+UNCHANGED = ["series", "species", "spring"]
+
+# (prompt, theme expected in the top k, k)
+PROMPTS = [
+    ("A mysterious figure walking through a foggy Victorian street at midnight, gas lamps casting eerie shadows", "haunted", 5),
+    ("Bright summer festival with colorful decorations and joyful crowds dancing", "market", 3),
+    ("Futuristic cyberpunk cityscape with neon lights reflecting on wet streets", "cyberpunk", 1),
+    ("A man walking in a sand-covered battlefield, 1917", "war", 1),
+    ("Two lovers sharing a candlelit dinner on a balcony", "romantic", 3),
+]
+
+
+def main():
+    failures = []
+    for a, b in SAME_STEM:
+        if lemmatize(a) != lemmatize(b):
+            failures.append(f"'{a}' -> {lemmatize(a)} but '{b}' -> {lemmatize(b)}")
+    for word in UNCHANGED:
+        if lemmatize(word) != word:
+            failures.append(f"'{word}' -> {lemmatize(word)}")
+
+    noise = [term for term in terms("a dinner on a balcony in a city under the rain") if term in ("a", "on", "in", "under", "the", "in_a")]
+    if noise:
+        failures.append(f"stopword terms kept: {noise}")
+
+    index = get_catalogue().keyword_index
+    for prompt, theme, k in PROMPTS:
+        ranked = [entry["theme"] for entry in index.rank(prompt, top_k=k)]
+        status = "ok" if theme in ranked else "FAIL"
+        print(f"[{status}] {theme} in top {k}: {ranked}  <- {prompt[:60]}")
+        if theme not in ranked:
+            failures.append(f"{theme} not in top {k} for '{prompt}'")
+
+    for failure in failures:
+        print(f"[Keyword Check] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
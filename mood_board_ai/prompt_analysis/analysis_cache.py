@@ -0,0 +1,86 @@
+# analysis_cache.py
+
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(*parts) -> str:
+    """Stable key for image bytes plus any extra parameters (theme, method, ...)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        elif not isinstance(part, (bytes, bytearray)):
+            part = repr(part).encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Bounded LRU for image/prompt analysis results (palettes, CLIP features,
+    Gemini responses), safe to share across Streamlit sessions. With disk_dir
+    set, entries are also pickled to disk so they survive restarts.
+    """
+
+    def __init__(self, max_items: int = 512, disk_dir: str = None):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, namespace, key):
+        return os.path.join(self.disk_dir, namespace, f"{key}.pkl")
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            if (namespace, key) in self._items:
+                self._items.move_to_end((namespace, key))
+                self.hits += 1
+                return self._items[(namespace, key)]
+
+        if self.disk_dir and os.path.exists(self._disk_path(namespace, key)):
+            try:
+                with open(self._disk_path(namespace, key), "rb") as f:
+                    value = pickle.load(f)
+                self._remember(namespace, key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+            except Exception as e:
+                print(f"[Analysis Cache] Dropping unreadable entry {namespace}/{key}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, namespace: str, key: str, value):
+        self._remember(namespace, key, value)
+        if self.disk_dir:
+            path = self._disk_path(namespace, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(tmp_path, path)
+
+    def get_or_compute(self, namespace: str, key: str, compute):
+        value = self.get(namespace, key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(namespace, key, value)
+        return value
+
+    def _remember(self, namespace, key, value):
+        with self._lock:
+            self._items[(namespace, key)] = value
+            self._items.move_to_end((namespace, key))
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
@@ -2,47 +2,233 @@
 
 import torch
 import clip
-from PIL import Image
 import os
-import json
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from prompt_analysis.image_ingest import open_draft
+from prompt_analysis.theme_catalogue import get_catalogue
+
+MODEL_NAME = "ViT-B/32"
+CLIP_INPUT_SIZE = (224, 224)  # JPEGs are decoded straight to the smallest scale covering this
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+# "int8" swaps in dynamically quantized Linear layers on CPU hosts; ignored on GPU
+CLIP_BACKEND = os.getenv("MOODBOARD_CLIP_BACKEND", "fp32").lower()
+
+# CLIP is loaded on first use, not at import, so modes that never touch it start fast
+_clip = None
+_clip_lock = threading.Lock()
+
+def load_clip(backend: str = "fp32"):
+    """
+    Fresh (model, preprocess) pair. backend="int8" applies PyTorch dynamic
+    quantization to every nn.Linear in both the text and image transformers
+    (attention projections stay FP32), which shrinks weights ~4x and speeds up
+    CPU inference.
+    """
+    model, preprocess = clip.load(MODEL_NAME, device=device)
+    if backend == "int8" and device == "cpu":
+        model = torch.ao.quantization.quantize_dynamic(model.float().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    return model, preprocess
+
+def model_key() -> str:
+    """Identifies the active weights, so cached label embeddings never mix backends"""
+    return MODEL_NAME + ("-int8" if CLIP_BACKEND == "int8" and device == "cpu" else "")
+
+def get_clip():
+    """Process-wide (model, preprocess) pair, loaded once on first call"""
+    global _clip
+    if _clip is None:
+        with _clip_lock:
+            if _clip is None:
+                _clip = load_clip(CLIP_BACKEND)
+    return _clip
+
+def warm_up_in_background():
+    """Start loading CLIP (and the label embeddings) on a daemon thread"""
+    def warm():
+        try:
+            get_label_embeddings()
+        except Exception as e:
+            print(f"[CLIP Warm-up Error]: {e}")
+
+    thread = threading.Thread(target=warm, name="clip-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# (catalogue digest, model key) -> (labels, normalized label features)
+_label_embeddings = {}
 
 def load_labels():
-    with open("D:/Projects/Programs/python/KIf/mood_board_ai/data/theme_map.json", "r") as f:
-        theme_map = json.load(f)
-    return list(theme_map.keys())
+    return get_catalogue().labels
 
-def classify_prompt(user_prompt: str) -> str:
-    labels = load_labels()
+def _encode_labels(labels):
+    model, _ = get_clip()
     text_inputs = torch.cat([clip.tokenize(f"This is a {label} scene") for label in labels]).to(device)
-
     with torch.no_grad():
-        prompt_features = model.encode_text(clip.tokenize(user_prompt).to(device))
         label_features = model.encode_text(text_inputs)
+    return (label_features / label_features.norm(dim=-1, keepdim=True)).float().cpu().numpy()
 
+def get_label_embeddings():
+    """
+    Labels and their normalized CLIP text features. Computed once per theme_map
+    content and model, stored in the compiled theme catalogue, and memoized
+    in-process as a device tensor per catalogue.
+    """
+    model, _ = get_clip()
+    catalogue = get_catalogue()
+    stamp = (catalogue.digest, model_key())
+    if stamp in _label_embeddings:
+        return _label_embeddings[stamp]
+
+    label_features = torch.from_numpy(catalogue.get_label_features(model_key(), _encode_labels))
+    _label_embeddings.clear()
+    _label_embeddings[stamp] = (catalogue.labels, label_features.to(device=device, dtype=model.dtype))
+    return _label_embeddings[stamp]
+
+def classify_prompt(user_prompt: str) -> str:
+    model, _ = get_clip()
+    labels, label_features = get_label_embeddings()
+
+    with torch.no_grad():
+        prompt_features = model.encode_text(clip.tokenize(user_prompt).to(device))
         prompt_features /= prompt_features.norm(dim=-1, keepdim=True)
-        label_features /= label_features.norm(dim=-1, keepdim=True)
 
         similarities = (100.0 * prompt_features @ label_features.T).softmax(dim=-1)
         predicted_index = similarities.argmax().item()
 
     return labels[predicted_index]
 
+def prompt_label_similarities(user_prompt: str):
+    """(labels, softmax similarity per label) for one prompt, as a NumPy array"""
+    model, _ = get_clip()
+    labels, label_features = get_label_embeddings()
+
+    with torch.no_grad():
+        prompt_features = model.encode_text(clip.tokenize(user_prompt, truncate=True).to(device))
+        prompt_features /= prompt_features.norm(dim=-1, keepdim=True)
+        similarities = (100.0 * prompt_features @ label_features.T).softmax(dim=-1)
+
+    return labels, similarities[0].float().cpu().numpy()
+
 def classify_image(image_path: str) -> str:
-    labels = load_labels()
-    image = preprocess(Image.open(image_path)).unsqueeze(0).to(device)
-    text_inputs = torch.cat([clip.tokenize(f"This is a {label} scene") for label in labels]).to(device)
+    model, preprocess = get_clip()
+    labels, text_features = get_label_embeddings()
+    image = preprocess(open_draft(image_path, CLIP_INPUT_SIZE)).unsqueeze(0).to(device)
 
     with torch.no_grad():
         image_features = model.encode_image(image)
-        text_features = model.encode_text(text_inputs)
-
         image_features /= image_features.norm(dim=-1, keepdim=True)
-        text_features /= text_features.norm(dim=-1, keepdim=True)
 
         similarities = (100.0 * image_features @ text_features.T).softmax(dim=-1)
         predicted_index = similarities.argmax().item()
 
     return labels[predicted_index]
+
+
+# ---- Batch classification ----
+def _top_k(features, label_features, labels, top_k):
+    features = features / features.norm(dim=-1, keepdim=True)
+    similarities = (100.0 * features @ label_features.T).softmax(dim=-1)
+    scores, indices = similarities.float().topk(min(top_k, len(labels)), dim=-1)
+    return indices.cpu().numpy(), scores.cpu().numpy()
+
+def _to_arrays(labels, indices, scores):
+    return np.asarray(labels, dtype=object)[indices], scores
+
+def classify_prompts(prompts: list, batch_size: int = 256, top_k: int = 3):
+    """
+    Batch variant of classify_prompt. Returns (themes, scores), both shaped
+    (len(prompts), top_k) and ordered best first.
+    """
+    model, _ = get_clip()
+    labels, label_features = get_label_embeddings()
+    all_indices, all_scores = [], []
+
+    with torch.no_grad():
+        for start in range(0, len(prompts), batch_size):
+            tokens = clip.tokenize(prompts[start:start + batch_size], truncate=True).to(device)
+            indices, scores = _top_k(model.encode_text(tokens), label_features, labels, top_k)
+            all_indices.append(indices)
+            all_scores.append(scores)
+
+    if not all_indices:
+        k = min(top_k, len(labels))
+        return np.empty((0, k), dtype=object), np.empty((0, k), dtype=np.float32)
+    return _to_arrays(labels, np.concatenate(all_indices), np.concatenate(all_scores))
+
+def encode_texts(texts: list, batch_size: int = 256) -> np.ndarray:
+    """Normalized CLIP text features, float32 (len(texts), dim)"""
+    model, _ = get_clip()
+    chunks = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            features = model.encode_text(clip.tokenize(texts[start:start + batch_size], truncate=True).to(device))
+            chunks.append((features / features.norm(dim=-1, keepdim=True)).float().cpu().numpy())
+    return np.concatenate(chunks) if chunks else np.empty((0, model.visual.output_dim), dtype=np.float32)
+
+def encode_images(images: list, batch_size: int = 64) -> np.ndarray:
+    """Normalized CLIP image features for PIL images or preprocessed tensors, float32 (len(images), dim)"""
+    model, preprocess = get_clip()
+    chunks = []
+    with torch.no_grad():
+        for start in range(0, len(images), batch_size):
+            batch = [img if isinstance(img, torch.Tensor) else preprocess(img) for img in images[start:start + batch_size]]
+            features = model.encode_image(torch.stack(batch).to(device))
+            chunks.append((features / features.norm(dim=-1, keepdim=True)).float().cpu().numpy())
+    return np.concatenate(chunks) if chunks else np.empty((0, model.visual.output_dim), dtype=np.float32)
+
+def _load_image(image_path):
+    _, preprocess = get_clip()
+    try:
+        return preprocess(open_draft(image_path, CLIP_INPUT_SIZE))
+    except Exception as e:
+        print(f"[Image Load Error] {image_path}: {e}")
+        return None
+
+def classify_images(image_paths: list, batch_size: int = 64, top_k: int = 3, workers: int = 8):
+    """
+    Batch variant of classify_image. Images are decoded and preprocessed in a
+    thread pool one batch ahead of the CLIP forward pass. Returns (themes,
+    scores) shaped (len(image_paths), top_k); unreadable images get empty
+    themes and NaN scores.
+    """
+    model, _ = get_clip()
+    labels, label_features = get_label_embeddings()
+    k = min(top_k, len(labels))
+    themes = np.full((len(image_paths), k), "", dtype=object)
+    scores = np.full((len(image_paths), k), np.nan, dtype=np.float32)
+    starts = list(range(0, len(image_paths), batch_size))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit(start):
+            return [pool.submit(_load_image, path) for path in image_paths[start:start + batch_size]]
+
+        pending = submit(starts[0]) if starts else []
+        for n, start in enumerate(starts):
+            current = pending
+            pending = submit(starts[n + 1]) if n + 1 < len(starts) else []
+
+            loaded = [(start + offset, future.result()) for offset, future in enumerate(current)]
+            loaded = [(row, tensor) for row, tensor in loaded if tensor is not None]
+            if not loaded:
+                continue
+
+            rows = [row for row, _ in loaded]
+            batch = torch.stack([tensor for _, tensor in loaded]).to(device)
+            with torch.no_grad():
+                indices, batch_scores = _top_k(model.encode_image(batch), label_features, labels, k)
+            themes[rows], scores[rows] = _to_arrays(labels, indices, batch_scores)
+
+    return themes, scores
+
+def classify_loaded_images(images: list, batch_size: int = 64, top_k: int = 3):
+    """classify_images for PIL images or preprocessed tensors already in memory"""
+    labels, label_features = get_label_embeddings()
+    k = min(top_k, len(labels))
+    if not images:
+        return np.empty((0, k), dtype=object), np.empty((0, k), dtype=np.float32)
+    features = torch.from_numpy(encode_images(images, batch_size)).to(device=device, dtype=label_features.dtype)
+    indices, scores = _top_k(features, label_features, labels, k)
+    return _to_arrays(labels, indices, scores)
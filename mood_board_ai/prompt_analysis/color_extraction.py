@@ -0,0 +1,167 @@
+# color_extraction.py
+
+import numpy as np
+from prompt_analysis.image_ingest import open_draft
+
+SAMPLE_SIZE = (200, 200)
+METHODS = ("hist", "median_cut", "minibatch", "kmeans")
+
+
+def to_hex(centers: np.ndarray) -> list:
+    return ['#%02x%02x%02x' % tuple(int(round(v)) for v in center) for center in np.clip(centers, 0, 255)]
+
+
+def hex_to_rgb(colors: list) -> np.ndarray:
+    return np.array([[int(c.lstrip("#")[i:i + 2], 16) for i in (0, 2, 4)] for c in colors], dtype=np.float64)
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB (0-255, any leading shape) to CIELAB under D65"""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def lab_to_rgb(lab: np.ndarray) -> np.ndarray:
+    """Inverse of rgb_to_lab: CIELAB (D65) to sRGB 0-255 floats, clipped to gamut"""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * np.array([0.95047, 1.0, 1.08883])
+    linear = xyz @ np.array([
+        [3.2404542, -0.9692660, 0.0556434],
+        [-1.5371385, 1.8760108, -0.2040259],
+        [-0.4985314, 0.0415560, 1.0572252],
+    ])
+    linear = np.clip(linear, 0, 1)
+    rgb = np.where(linear > 0.0031308, 1.055 * linear ** (1 / 2.4) - 0.055, linear * 12.92)
+    return rgb * 255.0
+
+
+def image_pixels(image, size=SAMPLE_SIZE) -> np.ndarray:
+    """(N, 3) float RGB pixels from a PIL image, a path or bytes, resized for speed"""
+    image = open_draft(image, size).convert("RGB").resize(size)
+    return np.asarray(image, dtype=np.float64).reshape(-1, 3)
+
+
+# ---- Algorithms ----
+def _histogram(pixels: np.ndarray, bits: int = 4):
+    """Occupied bins of a 2^bits-per-channel histogram: (mean color, pixel count) per bin"""
+    q = pixels.astype(np.int64) >> (8 - bits)
+    bins = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    counts = np.bincount(bins, minlength=1 << (3 * bits))
+    sums = np.stack([np.bincount(bins, weights=pixels[:, c], minlength=counts.size) for c in range(3)], axis=1)
+    occupied = counts > 0
+    return sums[occupied] / counts[occupied, None], counts[occupied].astype(np.float64)
+
+
+def _weighted_kmeans(points: np.ndarray, weights: np.ndarray, k: int, iters: int = 25, seed: int = 42):
+    """Lloyd's algorithm over weighted points with k-means++ seeding"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(points))
+    first = rng.choice(len(points), p=weights / weights.sum())
+    centers = [points[first]]
+    d2 = ((points - points[first]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        probs = weights * d2
+        if probs.sum() <= 0:
+            break
+        pick = rng.choice(len(points), p=probs / probs.sum())
+        centers.append(points[pick])
+        d2 = np.minimum(d2, ((points - points[pick]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iters):
+        labels = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1).argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=weights * points[:, c], minlength=len(centers)) for c in range(3)], axis=1)
+        updated = np.where(totals[:, None] > 0, sums / np.maximum(totals, 1e-12)[:, None], centers)
+        if np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+
+    labels = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1).argmin(axis=1)
+    return centers, np.bincount(labels, weights=weights, minlength=len(centers))
+
+
+def _hist_palette(pixels, num_colors):
+    bin_colors, bin_counts = _histogram(pixels)
+    return _weighted_kmeans(bin_colors, bin_counts, num_colors)
+
+
+def _median_cut_palette(pixels, num_colors):
+    boxes = [pixels]
+    while len(boxes) < num_colors:
+        ranges = [np.ptp(box, axis=0).max() if len(box) > 1 else -1 for box in boxes]
+        i = int(np.argmax(ranges))
+        if ranges[i] <= 0:
+            break
+        box = boxes[i]
+        channel = np.ptp(box, axis=0).argmax()
+        order = np.argsort(box[:, channel], kind="stable")
+        half = len(box) // 2
+        boxes[i:i + 1] = [box[order[:half]], box[order[half:]]]
+    centers = np.array([box.mean(axis=0) for box in boxes])
+    return centers, np.array([len(box) for box in boxes], dtype=np.float64)
+
+
+def _minibatch_palette(pixels, num_colors):
+    from sklearn.cluster import MiniBatchKMeans
+
+    seeds, _ = _hist_palette(pixels, num_colors)
+    if len(seeds) < num_colors:
+        return _hist_palette(pixels, num_colors)
+    kmeans = MiniBatchKMeans(n_clusters=num_colors, init=seeds, n_init=1, batch_size=4096, max_iter=20, random_state=42)
+    kmeans.fit(pixels)
+    return kmeans.cluster_centers_, np.bincount(kmeans.labels_, minlength=num_colors).astype(np.float64)
+
+
+def _kmeans_palette(pixels, num_colors):
+    # the original full KMeans, kept as the accuracy reference
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=num_colors, n_init=10, random_state=42).fit(pixels)
+    return kmeans.cluster_centers_, np.bincount(kmeans.labels_, minlength=num_colors).astype(np.float64)
+
+
+_ALGORITHMS = {
+    "hist": _hist_palette,
+    "median_cut": _median_cut_palette,
+    "minibatch": _minibatch_palette,
+    "kmeans": _kmeans_palette,
+}
+
+
+# ---- Public API ----
+def extract_palette(image, num_colors: int = 5, method: str = "hist"):
+    """
+    Dominant colors of an image as (hex colors, pixel-share weights), sorted by
+    share. image can be a PIL image or a path. Solid or near-solid images may
+    return fewer than num_colors colors.
+    """
+    if method not in _ALGORITHMS:
+        raise ValueError(f"Unknown color extraction method: {method}. Choose from {METHODS}")
+    pixels = image_pixels(image)
+    centers, counts = _ALGORITHMS[method](pixels, num_colors)
+
+    keep = counts > 0
+    centers, counts = centers[keep], counts[keep]
+    order = np.argsort(-counts, kind="stable")
+    return to_hex(centers[order]), (counts[order] / counts.sum()).tolist()
+
+
+def extract_dominant_colors(image, num_colors: int = 5, method: str = "hist") -> list:
+    """Hex colors only, for callers that do not need weights"""
+    return extract_palette(image, num_colors, method)[0]
@@ -0,0 +1,100 @@
+# color_grading.py
+
+import numpy as np
+from itertools import permutations
+from PIL import Image
+from prompt_analysis.color_extraction import extract_palette, hex_to_rgb, rgb_to_lab, lab_to_rgb
+
+LUT_SIZE = 17  # grid points per channel, the usual size for preview/.cube LUTs
+SPREAD = 35.0  # ΔE radius over which a palette color's shift fades out
+LIGHTNESS_SHARE = 0.4  # fraction of the lightness shift applied, so contrast survives the grade
+
+
+def match_palettes(source_lab: np.ndarray, target_lab: np.ndarray, weights=None) -> np.ndarray:
+    """
+    Target color for each source color: the one-to-one assignment with the
+    smallest weighted ΔE (all assignments are tried, palettes are small). A
+    source palette larger than the target reuses target colors by nearest match.
+    """
+    m, n = len(source_lab), len(target_lab)
+    weights = np.full(m, 1.0 / m) if weights is None else np.asarray(weights, dtype=np.float64)
+    cost = np.linalg.norm(source_lab[:, None, :] - target_lab[None, :, :], axis=-1)  # (m, n)
+    if m > n or n > 8:
+        return target_lab[cost.argmin(axis=1)]
+    perms = np.array(list(permutations(range(n), m)))  # (P, m)
+    best = perms[(cost[np.arange(m), perms] * weights).sum(axis=1).argmin()]
+    return target_lab[best]
+
+
+def build_lut(source_colors: list, target_colors: list, weights=None, strength: float = 0.8, size: int = LUT_SIZE) -> np.ndarray:
+    """
+    3D LUT (size, size, size, 3) of output RGB in 0-255, indexed [r, g, b].
+    Each source palette color is pulled toward its matched theme color in
+    CIELAB; every grid node moves by a Gaussian-weighted blend of those shifts,
+    scaled by its closeness to the nearest palette entry. Colors near a palette
+    entry follow it, colors far from all of them stay put, and the mapping
+    stays smooth.
+    """
+    source_lab = rgb_to_lab(hex_to_rgb(source_colors))
+    target_lab = match_palettes(source_lab, rgb_to_lab(hex_to_rgb(target_colors)), weights)
+    shifts = (target_lab - source_lab) * np.array([LIGHTNESS_SHARE, 1.0, 1.0])
+
+    axis = np.linspace(0, 255, size)
+    grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+    grid_lab = rgb_to_lab(grid)
+    d2 = ((grid_lab[:, None, :] - source_lab[None, :, :]) ** 2).sum(axis=-1)
+    influence = np.exp(-d2 / (2 * SPREAD ** 2))
+    fade = influence.max(axis=1, keepdims=True)  # 1 on a palette color, toward 0 beyond SPREAD
+    mix = influence * (1.0 if weights is None else np.asarray(weights, dtype=np.float64))
+    mix /= np.maximum(mix.sum(axis=1, keepdims=True), 1e-12)
+
+    graded = grid_lab + strength * fade * (mix @ shifts)
+    return lab_to_rgb(graded).reshape(size, size, size, 3)
+
+
+def apply_lut(pixels: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Trilinear LUT lookup for a (..., 3) uint8 RGB array, fully vectorized"""
+    size = lut.shape[0]
+    flat_lut = lut.reshape(-1, 3).astype(np.float32)
+    coords = pixels.reshape(-1, 3).astype(np.float32) * np.float32((size - 1) / 255.0)
+    base = np.minimum(coords.astype(np.int32), size - 2)
+    frac = coords - base
+    index = (base[:, 0] * size + base[:, 1]) * size + base[:, 2]
+
+    def lerp(a, b, t):
+        return a + (b - a) * t[:, None]
+
+    fr, fg, fb = frac[:, 0], frac[:, 1], frac[:, 2]
+    step_r, step_g = size * size, size
+    low_r = lerp(
+        lerp(flat_lut[index], flat_lut[index + 1], fb),
+        lerp(flat_lut[index + step_g], flat_lut[index + step_g + 1], fb), fg,
+    )
+    index += step_r
+    high_r = lerp(
+        lerp(flat_lut[index], flat_lut[index + 1], fb),
+        lerp(flat_lut[index + step_g], flat_lut[index + step_g + 1], fb), fg,
+    )
+    out = lerp(low_r, high_r, fr)
+    return np.clip(out + 0.5, 0, 255).astype(np.uint8).reshape(pixels.shape)
+
+
+def grade_image(image: Image.Image, target_colors: list, strength: float = 0.8, palette=None, size: int = LUT_SIZE):
+    """
+    Preview of image graded toward target_colors (e.g. a theme's palette).
+    palette is the image's (colors, weights) if already extracted. Returns
+    (graded PIL image, LUT) so the same grade can be exported.
+    """
+    image = image.convert("RGB")
+    source_colors, weights = palette or extract_palette(image)
+    lut = build_lut(source_colors, target_colors, weights, strength, size)
+    return Image.fromarray(apply_lut(np.asarray(image), lut)), lut
+
+
+def lut_to_cube(lut: np.ndarray, title: str = "Moodboard grade") -> str:
+    """LUT as an Adobe/Resolve .cube file (red varies fastest)"""
+    size = lut.shape[0]
+    rows = lut.transpose(2, 1, 0, 3).reshape(-1, 3) / 255.0
+    lines = [f'TITLE "{title}"', f"LUT_3D_SIZE {size}"]
+    lines += [f"{r:.6f} {g:.6f} {b:.6f}" for r, g, b in rows]
+    return "\n".join(lines) + "\n"
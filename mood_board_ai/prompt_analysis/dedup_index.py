@@ -0,0 +1,161 @@
+# dedup_index.py
+
+import os
+import threading
+from collections import defaultdict
+import numpy as np
+from PIL import Image
+from prompt_analysis.color_extraction import rgb_to_lab, image_pixels
+from prompt_analysis.image_ingest import open_draft
+
+HASH_SIZE = 8  # 64-bit hashes
+MAX_DISTANCE = 6  # Hamming distance still treated as the same still (bursts, re-exports, small crops)
+TONE_TOLERANCE = 4.0  # ΔE per tonal range; a regrade or tint moves at least one range further than this
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(HASH_SIZE * 4)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in bits.ravel()), 2)
+
+
+def _gray(image, size) -> np.ndarray:
+    image = open_draft(image, size).convert("L").resize(size, Image.BILINEAR)
+    return np.asarray(image, dtype=np.float64)
+
+
+def phash(image) -> int:
+    """DCT perceptual hash: low-frequency 8x8 DCT coefficients of a 32x32 gray image vs their median"""
+    n = HASH_SIZE * 4
+    coefficients = (_DCT @ _gray(image, (n, n)) @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    return _bits_to_int(coefficients > np.median(coefficients[1:]))
+
+
+def dhash(image) -> int:
+    """Difference hash: whether each pixel of a 9x8 gray image is brighter than its right neighbour"""
+    pixels = _gray(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def tone_signature(image) -> np.ndarray:
+    """
+    Mean Lab color of the shadows, midtones and highlights (lightness terciles),
+    shape (3, 3). pHash only sees luminance structure; this tells apart copies
+    of the same frame with a different grade, tint or split toning.
+    """
+    lab = rgb_to_lab(image_pixels(image, size=(64, 64)))
+    order = np.argsort(lab[:, 0], kind="stable")
+    return np.stack([lab[part].mean(axis=0) for part in np.array_split(order, 3)])
+
+
+def tones_match(a: np.ndarray, b: np.ndarray, tolerance: float = TONE_TOLERANCE) -> bool:
+    return bool(np.linalg.norm(np.asarray(a) - np.asarray(b), axis=-1).max() <= tolerance)
+
+
+def format_tones(tones: np.ndarray) -> str:
+    return ",".join(f"{v:.2f}" for v in np.asarray(tones).ravel())
+
+
+def parse_tones(text: str):
+    """Tone signature from format_tones output, or None if missing/malformed"""
+    try:
+        values = [float(v) for v in text.split(",")]
+    except (AttributeError, ValueError):
+        return None
+    return np.array(values).reshape(3, 3) if len(values) == 9 else None
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """
+    Multi-index hashing over 64-bit hashes: each hash is filed under its 8
+    byte-wide chunks. Two hashes fewer than 8 bits apart must agree exactly on
+    at least one chunk, so a radius query only checks the hashes sharing a
+    chunk bucket instead of the whole library.
+    """
+
+    CHUNKS = HASH_SIZE * HASH_SIZE // 8
+
+    def __init__(self):
+        self.hashes = []
+        self.values = []
+        self.tables = [defaultdict(list) for _ in range(self.CHUNKS)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, item_hash: int, value):
+        row = len(self.hashes)
+        self.hashes.append(item_hash)
+        self.values.append(value)
+        for i, table in enumerate(self.tables):
+            table[(item_hash >> (8 * i)) & 0xFF].append(row)
+
+    def search(self, item_hash: int, max_distance: int) -> list:
+        """[(distance, value)] within max_distance, closest first"""
+        if max_distance >= self.CHUNKS:
+            raise ValueError(f"max_distance must be below {self.CHUNKS} for multi-index lookup")
+        candidates = set()
+        for i, table in enumerate(self.tables):
+            candidates.update(table.get((item_hash >> (8 * i)) & 0xFF, ()))
+        found = [(hamming(item_hash, self.hashes[row]), row) for row in candidates]
+        return [(distance, self.values[row]) for distance, row in sorted(found) if distance <= max_distance]
+
+
+class DedupIndex:
+    """
+    Perceptual hashes of analysed images mapped to their analysis keys. A new
+    image within max_distance of a known one, and with matching tones, reuses
+    that key, so every cached analysis (palette, CLIP features, Gemini
+    critique) is shared by its near duplicates but never by a regraded copy.
+    With path set, entries are appended to a text file and reloaded on start.
+    """
+
+    def __init__(self, path: str = None, max_distance: int = MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self.hashes = HashIndex()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    parts = line.strip().split(" ", 2)
+                    tones = parse_tones(parts[1]) if len(parts) == 3 else None
+                    if tones is not None:  # lines written before tones were recorded are dropped
+                        self.hashes.add(int(parts[0], 16), (parts[2], tones))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def find(self, item_hash: int, tones: np.ndarray) -> list:
+        """[(distance, key)] of known images near item_hash whose tones also match, closest first"""
+        with self._lock:
+            matches = self.hashes.search(item_hash, self.max_distance)
+        return [(distance, key) for distance, (key, known) in matches if tones_match(tones, known)]
+
+    def add(self, item_hash: int, key: str, tones: np.ndarray):
+        with self._lock:
+            self.hashes.add(item_hash, (key, np.asarray(tones)))
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(f"{item_hash:016x} {format_tones(tones)} {key}\n")
+
+    def canonical_key(self, key: str, image) -> str:
+        """Key of the closest known near-duplicate of image, or key itself (now registered)"""
+        item_hash, tones = phash(image), tone_signature(image)
+        matches = self.find(item_hash, tones)
+        if matches:
+            return matches[0][1]
+        self.add(item_hash, key, tones)
+        return key
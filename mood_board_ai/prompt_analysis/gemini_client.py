@@ -0,0 +1,106 @@
+# gemini_client.py
+
+import os
+import asyncio
+import threading
+
+GEMINI_MODEL = "models/gemini-2.5-pro"
+MAX_CONCURRENCY = int(os.getenv("MOODBOARD_GEMINI_CONCURRENCY", "4"))
+REQUEST_TIMEOUT = float(os.getenv("MOODBOARD_GEMINI_TIMEOUT", "60"))
+
+
+async def generate_text(contents, semaphore: asyncio.Semaphore, timeout: float = REQUEST_TIMEOUT, model_name: str = GEMINI_MODEL):
+    """One generate_content call as text, or None on error or timeout"""
+    from prompt_analysis.recommend_color import get_genai
+
+    model = get_genai().GenerativeModel(model_name)
+    async with semaphore:
+        try:
+            response = await asyncio.wait_for(model.generate_content_async(contents), timeout)
+            return response.text
+        except asyncio.TimeoutError:
+            print(f"[Gemini Timeout]: no response after {timeout:.0f}s")
+        except Exception as e:
+            print(f"[Gemini Error]: {e}")
+    return None
+
+
+async def _run_local(job, timeout):
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(job), timeout)
+    except asyncio.TimeoutError:
+        print(f"[Parallel Job Timeout]: {getattr(job, '__name__', job)} took over {timeout:.0f}s")
+    except Exception as e:
+        print(f"[Parallel Job Error]: {e}")
+    return None
+
+
+async def gather_jobs(jobs: list, concurrency: int = MAX_CONCURRENCY, timeout: float = REQUEST_TIMEOUT) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(
+        _run_local(job, timeout) if callable(job) else generate_text(job, semaphore, timeout)
+        for job in jobs
+    ))
+
+
+# google-generativeai caches its async gRPC client per process, bound to the
+# event loop of the first call; every batch therefore runs on this one
+# long-lived loop instead of a fresh asyncio.run() loop that is closed after.
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gemini-loop", daemon=True).start()
+    return _loop
+
+
+def run_parallel(jobs: list, concurrency: int = MAX_CONCURRENCY, timeout: float = REQUEST_TIMEOUT) -> list:
+    """
+    Run independent jobs at once and return their results in order. A job is
+    either Gemini contents (a prompt string or a list of parts; at most
+    `concurrency` requests in flight) or a zero-argument callable for local
+    work, run in a worker thread. Failed or timed-out jobs return None, so
+    end-to-end latency is the slowest job rather than the sum.
+    """
+    if not jobs:
+        return []
+    return asyncio.run_coroutine_threadsafe(gather_jobs(jobs, concurrency, timeout), _background_loop()).result()
+
+
+class TextStream:
+    """
+    Iterable over the reply text chunks of one streamed Gemini call. Errors
+    and timeouts are printed and end the iteration early; complete is only
+    set once the whole reply arrived, so partial text is never cached.
+    """
+
+    def __init__(self, contents, model_name: str = GEMINI_MODEL, timeout: float = REQUEST_TIMEOUT):
+        self.contents = contents
+        self.model_name = model_name
+        self.timeout = timeout
+        self.complete = False
+
+    def __iter__(self):
+        from prompt_analysis.recommend_color import get_genai
+
+        model = get_genai().GenerativeModel(self.model_name)
+        try:
+            for chunk in model.generate_content(self.contents, stream=True, request_options={"timeout": self.timeout}):
+                if chunk.parts:
+                    yield chunk.text
+            self.complete = True
+        except Exception as e:
+            print(f"[Gemini Stream Error]: {e}")
+
+
+def stream_text(contents, model_name: str = GEMINI_MODEL, timeout: float = REQUEST_TIMEOUT) -> TextStream:
+    """
+    Reply text chunk by chunk as Gemini generates it, so a UI can render the
+    first section while the rest is still being written. Check .complete
+    after iterating before treating the text as the full reply.
+    """
+    return TextStream(contents, model_name, timeout)
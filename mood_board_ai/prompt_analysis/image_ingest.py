@@ -0,0 +1,38 @@
+# image_ingest.py
+
+import io
+from PIL import Image
+
+DECODE_SIZE = 512  # long side of the shared buffer: covers palettes (200), CLIP (224) and the Gemini upload
+GEMINI_IMAGE_SIZE = 384  # enough for a mood/color critique, and a fraction of the upload
+
+
+def open_draft(source, size=(DECODE_SIZE, DECODE_SIZE)) -> Image.Image:
+    """
+    Open a path, bytes or file-like object for decoding at reduced size. For
+    JPEGs, draft mode makes libjpeg scale by 1/2, 1/4 or 1/8 in the DCT domain
+    so the decoded image is the smallest such scale that still covers size;
+    other formats decode normally. An opened but not yet loaded PIL image is
+    accepted too.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    if image.format == "JPEG":  # no-op once the image has been loaded
+        image.draft("RGB", size)
+    return image
+
+
+def decode_image(source, max_side: int = DECODE_SIZE) -> Image.Image:
+    """RGB image with its long side at most max_side, decoded as small as possible"""
+    image = open_draft(source, (max_side, max_side)).convert("RGB")
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side))
+    return image
+
+
+def jpeg_part(image: Image.Image, quality: int = 90) -> dict:
+    """Inline JPEG blob for Gemini; smaller than the PNG the SDK encodes for PIL images"""
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=quality)
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
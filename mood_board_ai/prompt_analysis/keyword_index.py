@@ -0,0 +1,128 @@
+# keyword_index.py
+
+import re
+import math
+import numpy as np
+from collections import defaultdict
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_IRREGULAR = {
+    "men": "man", "women": "woman", "children": "child", "people": "person", "feet": "foot", "mice": "mouse",
+    "knives": "knife", "wolves": "wolf", "thieves": "thief", "series": "series", "species": "species",
+}
+PREFIX_MIN = 4  # shortest indexed word a compound may be matched by
+# function words carry no theme; left in, their postings outweigh the real keywords
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers herself
+him himself his how i if in into is it its itself just me more most my myself no nor not of off on once only or
+other our ours ourselves out over own same she should so some such than that the their theirs them themselves
+then there these they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours yourself yourselves
+""".split())
+
+
+def lemmatize(word: str) -> str:
+    """
+    Light rule-based stemmer for English nouns/verbs; no NLTK download needed.
+    Keywords and prompts go through the same rules, so a final -e is dropped
+    as well: 'dance', 'dances', 'danced' and 'dancing' all become 'danc'.
+    """
+    if word in _IRREGULAR:
+        return _IRREGULAR[word]
+    if len(word) <= 3 or word.isdigit():
+        return word
+    stem = word
+    if word.endswith("ies") and len(word) > 4:
+        stem = word[:-3] + "y"
+    elif word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        stem = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        stem = word[:-1]
+    elif word.endswith("ing") and len(word) > 5 and re.search(r"[aeiouy]", word[:-3]):
+        stem = word[:-3]
+        stem = stem[:-1] if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in "lsz" else stem
+    elif word.endswith("ed") and not word.endswith("eed") and len(word) > 4:
+        stem = word[:-2]
+        stem = stem[:-1] if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in "lsz" else stem
+    return stem[:-1] if len(stem) > 3 and stem.endswith("e") else stem
+
+
+def terms(text: str) -> list:
+    """Stems of the content words plus bigrams of adjacent ones, so 'gas mask' matches as a phrase"""
+    lemmas = [lemmatize(token) for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+    return lemmas + [f"{a}_{b}" for a, b in zip(lemmas, lemmas[1:])]
+
+
+class KeywordIndex:
+    """
+    Inverted index from lemmatized prompt_keywords (and theme names) to themes
+    with TF-IDF weights, L2-normalized per theme. Ranking a prompt touches only
+    the posting lists of its terms.
+    """
+
+    def __init__(self, theme_data: dict):
+        self.themes = list(theme_data.keys())
+        theme_terms = []
+        for theme, data in theme_data.items():
+            counts = defaultdict(float)
+            for phrase in data.get("prompt_keywords", []) + [theme.replace("_", " ")]:
+                phrase_terms = terms(phrase)
+                # a multiword keyword is indexed by its own bigram(s) and, more weakly, its words
+                for term in phrase_terms:
+                    counts[term] += 1.0 if "_" in term or len(phrase_terms) == 1 else 0.5
+            theme_terms.append(counts)
+
+        df = defaultdict(int)
+        for counts in theme_terms:
+            for term in counts:
+                df[term] += 1
+
+        n = len(self.themes)
+        self.postings = defaultdict(list)
+        for t, counts in enumerate(theme_terms):
+            weights = {term: tf * math.log(1 + n / df[term]) for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings[term].append((t, weight / norm))
+
+    def _postings(self, term: str):
+        """
+        Postings of term; a word with none falls back, at half weight, to the
+        longest indexed word (4+ letters) it starts with, so compounds such as
+        'candlelit' or 'moonlight' still reach 'candle' or 'moon'.
+        """
+        if term in self.postings or "_" in term:
+            return self.postings.get(term, ())
+        for end in range(len(term) - 1, PREFIX_MIN - 1, -1):
+            if term[:end] in self.postings:
+                return [(t, weight * 0.5) for t, weight in self.postings[term[:end]]]
+        return ()
+
+    def scores(self, prompt: str) -> np.ndarray:
+        """Raw keyword score per theme, in self.themes order"""
+        scores = np.zeros(len(self.themes))
+        for term in terms(prompt):
+            for t, weight in self._postings(term):
+                scores[t] += weight
+        return scores
+
+    def rank(self, prompt: str, top_k: int = 3, clip_weight: float = 0.0) -> list:
+        """
+        Top-k themes as [{"theme", "score"}], matching the Gemini output format.
+        With clip_weight > 0 the keyword scores are blended with the cached CLIP
+        prompt/label similarity, which also covers prompts with no keyword hits.
+        """
+        scores = self.scores(prompt)
+        if scores.max() > 0:
+            scores = scores / scores.max()
+
+        if clip_weight > 0:
+            from prompt_analysis.classify_prompt import prompt_label_similarities
+
+            labels, similarities = prompt_label_similarities(prompt)
+            clip_scores = dict(zip(labels, similarities / max(similarities.max(), 1e-12)))
+            scores = (1 - clip_weight) * scores + clip_weight * np.array([clip_scores.get(t, 0.0) for t in self.themes])
+
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [{"theme": self.themes[i], "score": round(float(scores[i]), 2)} for i in order if scores[i] > 0]
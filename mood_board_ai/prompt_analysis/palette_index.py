@@ -0,0 +1,130 @@
+# palette_index.py
+
+import os
+import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from prompt_analysis.color_extraction import hex_to_rgb, rgb_to_lab, image_pixels
+from prompt_analysis.reference_library import iter_image_paths
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "palette_index")
+
+# Lab grid: 4 lightness x 6 x 6 chroma bins = 144-dim signature (288 bytes as float16)
+L_BINS, AB_BINS = 4, 6
+L_RANGE, AB_RANGE = (0.0, 100.0), (-80.0, 80.0)
+SIGNATURE_DIM = L_BINS * AB_BINS * AB_BINS
+
+
+def lab_signature(lab: np.ndarray, weights=None) -> np.ndarray:
+    """
+    Fixed-length palette signature: a Lab histogram built with trilinear
+    splatting (so nearby colors share bins), returned as the square root of
+    the normalized histogram. Dot products of signatures are then Bhattacharyya
+    coefficients, so similarity search is a single matrix product.
+    """
+    lab = np.asarray(lab, dtype=np.float64).reshape(-1, 3)
+    weights = np.ones(len(lab)) if weights is None else np.asarray(weights, dtype=np.float64)
+    sizes = np.array([L_BINS, AB_BINS, AB_BINS])
+    lows = np.array([L_RANGE[0], AB_RANGE[0], AB_RANGE[0]])
+    highs = np.array([L_RANGE[1], AB_RANGE[1], AB_RANGE[1]])
+
+    # continuous bin coordinates with bin centers at integers
+    coords = np.clip((lab - lows) / (highs - lows) * sizes - 0.5, 0, sizes - 1)
+    base = np.minimum(np.floor(coords).astype(np.int64), sizes - 2)
+    frac = coords - base
+
+    histogram = np.zeros(SIGNATURE_DIM)
+    for corner in range(8):
+        offset = np.array([(corner >> 2) & 1, (corner >> 1) & 1, corner & 1])
+        share = np.prod(np.where(offset, frac, 1 - frac), axis=1) * weights
+        cells = base + offset
+        flat = (cells[:, 0] * AB_BINS + cells[:, 1]) * AB_BINS + cells[:, 2]
+        histogram += np.bincount(flat, weights=share, minlength=SIGNATURE_DIM)
+
+    return np.sqrt(histogram / max(histogram.sum(), 1e-12)).astype(np.float32)
+
+
+def image_signature(image) -> np.ndarray:
+    return lab_signature(rgb_to_lab(image_pixels(image, size=(100, 100))))
+
+
+def palette_signature(colors: list, weights=None) -> np.ndarray:
+    return lab_signature(rgb_to_lab(hex_to_rgb(colors)), weights)
+
+
+class PaletteIndex:
+    """
+    Palette signatures for a still library in one compact float16 array.
+    Queries ("closest to theme X", "closest to this image") are a single
+    vectorized matrix-vector product over the whole library.
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self.entries = []  # [{"path", "mtime"}], row-aligned with signatures
+        self.signatures = np.empty((0, SIGNATURE_DIM), dtype=np.float16)
+        self._matrix = None  # float32 copy used for search, rebuilt after ingest
+        entries_path, signatures_path = self._paths()
+        if os.path.exists(entries_path) and os.path.exists(signatures_path):
+            with open(entries_path, "r") as f:
+                self.entries = json.load(f)
+            self.signatures = np.load(signatures_path)
+
+    def _paths(self):
+        return os.path.join(self.index_dir, "entries.json"), os.path.join(self.index_dir, "signatures.npy")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _signature_or_none(self, path):
+        try:
+            return image_signature(path)
+        except Exception as e:
+            print(f"[Palette Index] Skipping {path}: {e}")
+            return None
+
+    def ingest(self, folder: str, workers: int = 8) -> int:
+        """Add new or modified stills from folder; returns how many were added"""
+        known = {entry["path"]: i for i, entry in enumerate(self.entries)}
+        todo = [
+            path for path in iter_image_paths(folder)
+            if path not in known or self.entries[known[path]]["mtime"] != os.path.getmtime(path)
+        ]
+        if not todo:
+            return 0
+
+        stale = {known[path] for path in todo if path in known}
+        keep = [i for i in range(len(self.entries)) if i not in stale]
+        self.entries = [self.entries[i] for i in keep]
+        self.signatures = self.signatures[keep]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            computed = [(path, sig) for path, sig in zip(todo, pool.map(self._signature_or_none, todo)) if sig is not None]
+        if computed:
+            self.entries.extend({"path": path, "mtime": os.path.getmtime(path)} for path, _ in computed)
+            self.signatures = np.concatenate([self.signatures, np.stack([sig for _, sig in computed]).astype(np.float16)])
+
+        self._matrix = None
+        entries_path, signatures_path = self._paths()
+        os.makedirs(self.index_dir, exist_ok=True)
+        np.save(signatures_path, self.signatures)
+        with open(entries_path, "w") as f:
+            json.dump(self.entries, f)
+        return len(computed)
+
+    def search_signature(self, signature: np.ndarray, k: int = 12) -> list:
+        if not len(self):
+            return []
+        if self._matrix is None:
+            self._matrix = self.signatures.astype(np.float32)
+        scores = self._matrix @ signature.astype(np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.entries[i], "score": float(scores[i])} for i in top]
+
+    def search_theme(self, theme: str, theme_data: dict, k: int = 12) -> list:
+        return self.search_signature(palette_signature(theme_data[theme]["colors"]), k)
+
+    def search_image(self, image, k: int = 12) -> list:
+        return self.search_signature(image_signature(image), k)
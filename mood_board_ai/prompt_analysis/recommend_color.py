@@ -1,23 +1,33 @@
 import json
-import google.generativeai as genai
 import re
 import os
 from dotenv import load_dotenv
-from sklearn.cluster import KMeans
-from PIL import Image
 import numpy as np
+from itertools import permutations
+
+from prompt_analysis import color_extraction
+from prompt_analysis.color_extraction import hex_to_rgb, rgb_to_lab
+from prompt_analysis.theme_catalogue import THEME_MAP_PATH, get_catalogue, palette_arrays
 
 load_dotenv()  # loads from .env by default
 
-api_key = os.getenv("GEMINI_API_KEY")
+_genai = None
 
-genai.configure(api_key=api_key)
+def get_genai():
+    """google.generativeai, imported and configured on the first Gemini call"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
 
-def load_theme_data(path="D:/Projects/Programs/python/KIf/mood_board_ai/data/theme_map.json"):
-    with open(path, "r") as f:
-        return json.load(f)
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        _genai = genai
+    return _genai
 
-def guess_top_themes_with_gemini(prompt: str, theme_data: dict) -> list:
+def load_theme_data(path=None):
+    """Theme data from the compiled catalogue (data/theme_map.json, or MOODBOARD_THEME_MAP)"""
+    return get_catalogue(path or THEME_MAP_PATH).theme_data
+
+def _prompt_themes_request(prompt: str, theme_data: dict) -> str:
     theme_descriptions = []
     for theme, data in theme_data.items():
         keywords = ", ".join(data.get("prompt_keywords", []))
@@ -25,8 +35,7 @@ def guess_top_themes_with_gemini(prompt: str, theme_data: dict) -> list:
 
     theme_prompt = "\n".join(theme_descriptions)
 
-    model = genai.GenerativeModel("models/gemini-2.5-pro")
-    response = model.generate_content(f"""
+    return f"""
 You are given a user prompt: "{prompt}".
 
 Here are available themes and their associated keywords:
@@ -40,23 +49,36 @@ Respond with a JSON list of objects like this:
   {{"theme": "cyberpunk", "score": 0.65}}
 ]
 Only respond with the JSON. No explanation.
-""")
-    print("[Gemini Raw Response]:", response)
-
+"""
 
-    raw_text = response.text.strip()
+def _parse_themes(raw_text, allowed) -> list:
+    """Theme entries from a Gemini JSON reply (fenced or bare), limited to allowed themes; None if unparseable"""
+    if raw_text is None:
+        return None
+    raw_text = raw_text.strip()
     print("[Gemini Raw Response]:", raw_text)
 
     match = re.search(r"```json\s*(.*?)\s*```", raw_text, re.DOTALL)
-    if match:
-        json_str = match.group(1)
-        try:
-            result = json.loads(json_str)
-            return [entry for entry in result if entry["theme"] in theme_data]
-        except json.JSONDecodeError as e:
-            print(f"[Error parsing Gemini JSON]: {e}")
-    else:
-        print("[Error]: No JSON block found in Gemini response.")
+    try:
+        result = json.loads(match.group(1) if match else raw_text)
+        return [entry for entry in result if entry.get("theme") in allowed]
+    except (json.JSONDecodeError, AttributeError, TypeError) as e:
+        print(f"[Error parsing Gemini JSON]: {e}")
+    return None
+
+def guess_top_themes_with_gemini(prompt: str, theme_data: dict) -> list:
+    return guess_top_themes_batch([prompt], theme_data)[0]
+
+def guess_top_themes_batch(prompts: list, theme_data: dict, concurrency: int = None) -> list:
+    """
+    guess_top_themes_with_gemini for many prompts, sent concurrently (bounded
+    by MOODBOARD_GEMINI_CONCURRENCY). One result per prompt; None where the
+    call failed or returned no usable JSON.
+    """
+    from prompt_analysis.gemini_client import run_parallel, MAX_CONCURRENCY
+
+    replies = run_parallel([_prompt_themes_request(p, theme_data) for p in prompts], concurrency or MAX_CONCURRENCY)
+    return [_parse_themes(reply, theme_data) for reply in replies]
 
 def recommend_attributes(theme_label: str, theme_data: dict) -> dict:
     return theme_data.get(theme_label, {
@@ -66,53 +88,102 @@ def recommend_attributes(theme_label: str, theme_data: dict) -> dict:
     })
 
 
-def extract_dominant_colors(image_path: str, num_colors=5) -> list:
-    image = Image.open(image_path).convert("RGB")
-    image = image.resize((200, 200))  # Resize for faster processing
-    img_array = np.array(image).reshape((-1, 3))
-
-    kmeans = KMeans(n_clusters=num_colors, n_init=10)
-    kmeans.fit(img_array)
-    centers = kmeans.cluster_centers_
-
-    # Convert to hex color codes
-    hex_colors = ['#%02x%02x%02x' % tuple(map(int, center)) for center in centers]
-    return hex_colors
-
-def guess_themes_from_colors(colors: list, theme_data: dict) -> list:
-    theme_color_map = {
-        theme: data.get("colors", []) for theme, data in theme_data.items()
-    }
-
-    # Prepare a string prompt for Gemini based on dominant colors
-    model = genai.GenerativeModel("models/gemini-2.5-pro")
-    prompt = f"""
+def extract_dominant_colors(image_path: str, num_colors=5, method="hist") -> list:
+    # shared engine in color_extraction.py; method="kmeans" reproduces the old full KMeans
+    return color_extraction.extract_dominant_colors(image_path, num_colors, method)
+
+# ---- Local palette matching ----
+def palette_distances(image_lab: np.ndarray, theme_labs: np.ndarray, weights=None) -> np.ndarray:
+    """
+    Assignment-based palette distance from one palette (m, 3) to every theme
+    palette (T, n, 3): each image color is matched to a distinct theme color so
+    the weighted mean ΔE is minimal. Small palettes are solved exactly over all
+    assignments at once; larger ones fall back to nearest-color matching.
+    """
+    m, n = len(image_lab), theme_labs.shape[1]
+    weights = np.full(m, 1.0 / m) if weights is None else np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    cost = np.linalg.norm(image_lab[None, :, None, :] - theme_labs[:, None, :, :], axis=-1)  # (T, m, n)
+
+    if m <= n <= 8:
+        perms = np.array(list(permutations(range(n), m)))  # (P, m)
+        assigned = cost[:, np.arange(m), perms]  # (T, P, m)
+        return (assigned * weights).sum(axis=-1).min(axis=-1)
+    if n < m <= 8:
+        perms = np.array(list(permutations(range(m), n)))  # (P, n): image color per theme color
+        assigned = cost[:, perms, np.arange(n)]  # (T, P, n)
+        assigned_weights = weights[perms] / weights[perms].sum(axis=-1, keepdims=True)  # shares of the assigned image colors
+        return (assigned * assigned_weights).sum(axis=-1).min(axis=-1)
+    return (cost.min(axis=-1) * weights).sum(axis=-1)
+
+def rank_themes_by_palette(colors: list, theme_data: dict, top_k: int = 3, weights=None) -> list:
+    """Top-k themes for a palette, scored locally in CIELAB without any LLM call"""
+    catalogue = get_catalogue()
+    if theme_data is catalogue.theme_data:
+        themes, theme_labs = catalogue.palette_themes, catalogue.palette_labs
+    else:  # a hand-built or filtered theme dict
+        themes, theme_labs = palette_arrays(theme_data)
+    if not colors or not themes:
+        return []
+    distances = palette_distances(rgb_to_lab(hex_to_rgb(colors)), theme_labs, weights)
+
+    order = np.argsort(distances)[:top_k]
+    return [{"theme": themes[i], "score": round(float(np.exp(-distances[i] / 40.0)), 2)} for i in order]
+
+def _color_themes_request(colors: list, theme_color_map: dict) -> str:
+    return f"""
 You are given a list of dominant colors from an image: {colors}
 
-Here are available themes and their color palettes:
+Here is a shortlist of candidate themes (closest palettes first) and their color palettes:
 {json.dumps(theme_color_map, indent=2)}
 
-Compare the dominant image colors to each theme's palette. Also think logically on what would be theme of the scene if the color palettes are as given and return the 3 most relevant theme matches with confidence scores. Condition is that the 3 themes should present in the available themes.
+Compare the dominant image colors to each theme's palette. Also think logically on what would be theme of the scene if the color palettes are as given and return the 3 most relevant theme matches with confidence scores and a one-sentence reason. Condition is that the 3 themes should present in the shortlist.
 Respond ONLY with JSON in this format:
 [
-  {{"theme": "war", "score": 0.85}},
-  {{"theme": "neo noir", "score": 0.79}},
-  {{"theme": "surreal", "score": 0.69}}
+  {{"theme": "war", "score": 0.85, "reason": "..."}},
+  {{"theme": "neo noir", "score": 0.79, "reason": "..."}},
+  {{"theme": "surreal", "score": 0.69, "reason": "..."}}
 ]
 """
-    response = model.generate_content(prompt)
-    print("[Gemini Color Response]:", response.text)
-
-    match = re.search(r"```json\s*(.*?)\s*```", response.text.strip(), re.DOTALL)
-    if match:
-        try:
-            result = json.loads(match.group(1))
-            return [entry for entry in result if entry["theme"] in theme_data]
-        except json.JSONDecodeError as e:
-            print(f"[Gemini Color JSON Parse Error]: {e}")
-    else:
-        try:
-            return json.loads(response.text.strip())  # fallback if no ```json block
-        except:
-            print("[Gemini Color Parse Error]: Response not JSON")
-    return []
+
+def guess_themes_from_colors(colors: list, theme_data: dict, use_gemini: bool = False, shortlist_size: int = 8, weights=None) -> list:
+    """
+    Top 3 themes for the extracted colors. Ranking is done locally; with
+    use_gemini the local shortlist is sent to Gemini to rerank and explain.
+    """
+    return guess_themes_from_colors_batch([colors], theme_data, use_gemini, shortlist_size, [weights])[0]
+
+def refine_themes_from_colors(colors: list, theme_data: dict, shortlist_size: int = 8, weights=None) -> list:
+    """Gemini's top 3 from the local shortlist, or None if the call failed (nothing to cache)"""
+    return refine_themes_from_colors_batch([colors], theme_data, shortlist_size, [weights])[0]
+
+def _color_shortlists(palettes: list, theme_data: dict, shortlist_size: int, weights: list) -> list:
+    weights = weights or [None] * len(palettes)
+    return [
+        rank_themes_by_palette(colors, theme_data, top_k=shortlist_size, weights=w) for colors, w in zip(palettes, weights)
+    ]
+
+def refine_themes_from_colors_batch(palettes: list, theme_data: dict, shortlist_size: int = 8, weights: list = None, shortlists: list = None) -> list:
+    """
+    Gemini rerank of each palette's local shortlist, sent concurrently. None
+    where the call failed or returned no usable JSON.
+    """
+    from prompt_analysis.gemini_client import run_parallel
+
+    shortlists = shortlists or _color_shortlists(palettes, theme_data, shortlist_size, weights)
+    theme_color_maps = [
+        {entry["theme"]: theme_data[entry["theme"]].get("colors", []) for entry in shortlist} for shortlist in shortlists
+    ]
+    replies = run_parallel([_color_themes_request(colors, m) for colors, m in zip(palettes, theme_color_maps)])
+    return [_parse_themes(reply, theme_color_map) for reply, theme_color_map in zip(replies, theme_color_maps)]
+
+def guess_themes_from_colors_batch(palettes: list, theme_data: dict, use_gemini: bool = False, shortlist_size: int = 8, weights: list = None) -> list:
+    """
+    guess_themes_from_colors for many palettes. The Gemini reranks run
+    concurrently; a palette whose call fails keeps its local top 3.
+    """
+    shortlists = _color_shortlists(palettes, theme_data, shortlist_size, weights)
+    if not use_gemini:
+        return [shortlist[:3] for shortlist in shortlists]
+
+    refined = refine_themes_from_colors_batch(palettes, theme_data, shortlist_size, weights, shortlists)
+    return [themes or shortlist[:3] for themes, shortlist in zip(refined, shortlists)]
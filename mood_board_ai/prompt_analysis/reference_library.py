@@ -0,0 +1,215 @@
+# reference_library.py
+
+import os
+import json
+import hashlib
+import numpy as np
+from prompt_analysis.image_ingest import decode_image
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import faiss
+except ImportError:  # brute-force NumPy search still works for small libraries
+    faiss = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+DEFAULT_LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "reference_library")
+THUMBNAIL_SIZE = (256, 256)
+HNSW_THRESHOLD = 20000  # exact search below this many stills, HNSW above
+
+
+def iter_image_paths(folder: str):
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def thumbnail_name(path: str) -> str:
+    return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest() + ".jpg"
+
+
+class ReferenceLibrary:
+    """
+    Local library of reference stills: normalized CLIP image embeddings in a
+    FAISS inner-product index (HNSW once the library is large), a JSON manifest
+    of source paths, and JPEG thumbnails for display. Supports text-to-image and
+    image-to-image nearest-neighbour queries. The CLIP weights that encoded the
+    library are recorded; under different ones (e.g. MOODBOARD_CLIP_BACKEND
+    switched to int8) every still is re-encoded on load.
+    """
+
+    def __init__(self, library_dir: str = DEFAULT_LIBRARY_DIR):
+        self.library_dir = library_dir
+        self.thumb_dir = os.path.join(library_dir, "thumbs")
+        self.entries = []  # [{"path", "mtime", "thumb"}], row-aligned with embeddings
+        self.embeddings = None
+        self.index = None
+        self._load()
+
+    # ---- Persistence ----
+    def _paths(self):
+        return (
+            os.path.join(self.library_dir, "entries.json"),
+            os.path.join(self.library_dir, "embeddings.npy"),
+            os.path.join(self.library_dir, "index.faiss"),
+            os.path.join(self.library_dir, "library.json"),
+        )
+
+    def _load(self):
+        from prompt_analysis.classify_prompt import model_key
+
+        entries_path, embeddings_path, index_path, manifest_path = self._paths()
+        if not (os.path.exists(entries_path) and os.path.exists(embeddings_path)):
+            return
+        with open(entries_path, "r") as f:
+            self.entries = json.load(f)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        if manifest.get("model_key") != model_key():
+            print(f"[Reference Library] Re-encoding {len(self.entries)} stills for {model_key()} (was {manifest.get('model_key')})")
+            self.reencode()
+            return
+        self.embeddings = np.load(embeddings_path)
+        if faiss is not None and os.path.exists(index_path):
+            self.index = faiss.read_index(index_path)
+        else:
+            self._build_index()
+
+    def _save(self):
+        from prompt_analysis.classify_prompt import model_key
+
+        entries_path, embeddings_path, index_path, manifest_path = self._paths()
+        os.makedirs(self.library_dir, exist_ok=True)
+        np.save(embeddings_path, self.embeddings if self.embeddings is not None else np.empty((0, 0), dtype=np.float32))
+        with open(entries_path, "w") as f:
+            json.dump(self.entries, f)
+        with open(manifest_path, "w") as f:
+            json.dump({"model_key": model_key()}, f)
+        if faiss is not None and self.index is not None:
+            faiss.write_index(self.index, index_path)
+
+    def _build_index(self):
+        if faiss is None or self.embeddings is None or not len(self.embeddings):
+            self.index = None
+            return
+        dim = self.embeddings.shape[1]
+        if len(self.embeddings) >= HNSW_THRESHOLD:
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 80
+            index.hnsw.efSearch = 64
+        else:
+            index = faiss.IndexFlatIP(dim)
+        index.add(self.embeddings)
+        self.index = index
+
+    # ---- Ingest ----
+    def _prepare(self, path):
+        """Decode once: write the thumbnail and return the CLIP input tensor"""
+        from prompt_analysis.classify_prompt import get_clip
+
+        _, preprocess = get_clip()
+        try:
+            image = decode_image(path)
+            thumb_name = thumbnail_name(path)
+            thumbnail = image.copy()
+            thumbnail.thumbnail(THUMBNAIL_SIZE)
+            thumbnail.save(os.path.join(self.thumb_dir, thumb_name), "JPEG", quality=85)
+            return preprocess(image), thumb_name
+        except Exception as e:
+            print(f"[Reference Library] Skipping {path}: {e}")
+            return None
+
+    def _encode_paths(self, paths, batch_size=64, workers=8, progress=None):
+        """(entries, embeddings or None) for the readable stills among paths"""
+        from prompt_analysis.classify_prompt import encode_images
+
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        added_entries, added_embeddings = [], []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(paths), batch_size):
+                batch_paths = paths[start:start + batch_size]
+                prepared = [(path, item) for path, item in zip(batch_paths, pool.map(self._prepare, batch_paths)) if item]
+                if prepared:
+                    added_embeddings.append(encode_images([tensor for _, (tensor, _) in prepared], batch_size))
+                    added_entries.extend(
+                        {"path": path, "mtime": os.path.getmtime(path), "thumb": thumb} for path, (_, thumb) in prepared
+                    )
+                if progress:
+                    progress(min(start + batch_size, len(paths)), len(paths))
+        return added_entries, np.concatenate(added_embeddings) if added_embeddings else None
+
+    def reencode(self, batch_size: int = 64, workers: int = 8, progress=None) -> int:
+        """Encode every known still again with the current CLIP weights (missing files are dropped)"""
+        paths = [entry["path"] for entry in self.entries if os.path.exists(entry["path"])]
+        self.entries, self.embeddings = self._encode_paths(paths, batch_size, workers, progress)
+        self._build_index()
+        self._save()
+        return len(self.entries)
+
+    def ingest(self, folder: str, batch_size: int = 64, workers: int = 8, progress=None) -> int:
+        """
+        Add new or modified stills from folder. Images are decoded in a thread pool
+        and encoded with CLIP in batches. Returns the number of stills added.
+        """
+        known = {entry["path"]: i for i, entry in enumerate(self.entries)}
+        todo = [
+            path for path in iter_image_paths(folder)
+            if path not in known or self.entries[known[path]]["mtime"] != os.path.getmtime(path)
+        ]
+        stale = {known[path] for path in todo if path in known}
+        if stale:
+            keep = [i for i in range(len(self.entries)) if i not in stale]
+            self.entries = [self.entries[i] for i in keep]
+            self.embeddings = self.embeddings[keep]
+
+        added_entries, new_embeddings = self._encode_paths(todo, batch_size, workers, progress)
+        if not added_entries and not stale:
+            return 0
+        if self.embeddings is None or not len(self.embeddings):
+            self.embeddings = new_embeddings
+        elif new_embeddings is not None:
+            self.embeddings = np.concatenate([self.embeddings, new_embeddings])
+        self.entries.extend(added_entries)
+        self._build_index()
+        self._save()
+        return len(added_entries)
+
+    # ---- Queries ----
+    def __len__(self):
+        return len(self.entries)
+
+    def display_path(self, path: str) -> str:
+        """Thumbnail for a still if the library has one, otherwise the original file"""
+        thumb_path = os.path.join(self.thumb_dir, thumbnail_name(path))
+        return thumb_path if os.path.exists(thumb_path) else path
+
+    def search_vector(self, query: np.ndarray, k: int = 12) -> list:
+        if not len(self):
+            return []
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+        k = min(k, len(self))
+        if self.index is not None:
+            scores, ids = self.index.search(query, k)
+            scores, ids = scores[0], ids[0]
+        else:
+            all_scores = self.embeddings @ query[0]
+            ids = np.argpartition(-all_scores, k - 1)[:k]
+            ids = ids[np.argsort(-all_scores[ids])]
+            scores = all_scores[ids]
+        return [
+            {**self.entries[i], "thumb_path": os.path.join(self.thumb_dir, self.entries[i]["thumb"]), "score": float(s)}
+            for i, s in zip(ids, scores) if i >= 0
+        ]
+
+    def search_text(self, text: str, k: int = 12) -> list:
+        from prompt_analysis.classify_prompt import encode_texts
+
+        return self.search_vector(encode_texts([text])[0], k)
+
+    def search_image(self, image, k: int = 12) -> list:
+        from prompt_analysis.classify_prompt import encode_images
+
+        return self.search_vector(encode_images([image])[0], k)
@@ -0,0 +1,115 @@
+# theme_catalogue.py
+
+import os
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+from prompt_analysis.color_extraction import hex_to_rgb, rgb_to_lab
+from prompt_analysis.keyword_index import KeywordIndex
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+THEME_MAP_PATH = os.getenv("MOODBOARD_THEME_MAP", os.path.join(DATA_DIR, "theme_map.json"))
+CATALOGUE_DIR = os.path.join(DATA_DIR, "cache")
+CATALOGUE_FORMAT = 2  # bump when the compiled layout (or keyword term rules) changes
+
+
+def palette_arrays(theme_data: dict):
+    """(themes with colors, Lab palettes (T, n, 3)); shorter palettes are padded by repeating their last color"""
+    themes = [theme for theme, data in theme_data.items() if data.get("colors")]
+    if not themes:
+        return themes, np.empty((0, 0, 3))
+    size = max(len(theme_data[t]["colors"]) for t in themes)
+    return themes, rgb_to_lab(np.stack([
+        hex_to_rgb((theme_data[t]["colors"] + [theme_data[t]["colors"][-1]] * size)[:size]) for t in themes
+    ]))
+
+
+class ThemeCatalogue:
+    """
+    theme_map.json compiled once: theme data, label names, palette Lab arrays
+    (padded to one shape for vectorized matching), the keyword index, and CLIP
+    label embeddings per model as they are computed. Pickled to data/cache under
+    the hash of the source file, so a process normally just unpickles it.
+    """
+
+    def __init__(self, theme_data: dict, digest: str):
+        self.digest = digest
+        self.theme_data = theme_data
+        self.labels = list(theme_data.keys())
+        self.palette_themes, self.palette_labs = palette_arrays(theme_data)
+
+        self.keyword_index = KeywordIndex(theme_data)
+        self.label_features = {}  # model key -> normalized float32 (len(labels), dim)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def path(self) -> str:
+        return catalogue_path(self.digest)
+
+    def save(self):
+        os.makedirs(CATALOGUE_DIR, exist_ok=True)
+        tmp_path = f"{self.path()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"format": CATALOGUE_FORMAT, "catalogue": self}, f)
+        os.replace(tmp_path, self.path())
+
+    def get_label_features(self, model_key: str, compute) -> np.ndarray:
+        """CLIP label embeddings for model_key, computed with compute(labels) once and stored in the artefact"""
+        with self._lock:
+            if model_key not in self.label_features:
+                self.label_features[model_key] = np.asarray(compute(self.labels), dtype=np.float32)
+                self.save()
+            return self.label_features[model_key]
+
+
+def catalogue_path(digest: str) -> str:
+    return os.path.join(CATALOGUE_DIR, f"theme_catalogue_{digest}.pkl")
+
+
+def compile_catalogue(path: str = THEME_MAP_PATH) -> ThemeCatalogue:
+    """Load the compiled artefact for the current theme_map content, building it if needed"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()[:16]
+
+    if os.path.exists(catalogue_path(digest)):
+        try:
+            with open(catalogue_path(digest), "rb") as f:
+                payload = pickle.load(f)
+            if payload.get("format") == CATALOGUE_FORMAT:
+                return payload["catalogue"]
+        except Exception as e:
+            print(f"[Theme Catalogue] Rebuilding unreadable artefact: {e}")
+
+    catalogue = ThemeCatalogue(json.loads(raw), digest)
+    catalogue.save()
+    return catalogue
+
+
+# (theme_map path, mtime, size) -> catalogue; checking the stamp costs one stat() per call
+_catalogue = {}
+_catalogue_lock = threading.Lock()
+
+def get_catalogue(path: str = THEME_MAP_PATH) -> ThemeCatalogue:
+    """Process-wide catalogue, recompiled only when theme_map.json changes"""
+    stat = os.stat(path)
+    stamp = (path, stat.st_mtime_ns, stat.st_size)
+    catalogue = _catalogue.get(stamp)
+    if catalogue is None:
+        with _catalogue_lock:
+            catalogue = _catalogue.get(stamp)
+            if catalogue is None:
+                catalogue = compile_catalogue(path)
+                _catalogue.clear()
+                _catalogue[stamp] = catalogue
+    return catalogue
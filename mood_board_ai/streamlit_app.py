@@ -1,14 +1,17 @@
 import streamlit as st
-from prompt_analysis.classify_prompt import classify_prompt
 from prompt_analysis.recommend_color import (
     load_theme_data,
     recommend_attributes,
     guess_themes_from_colors,
+    refine_themes_from_colors,
 )
-from PIL import Image
-import numpy as np
-from sklearn.cluster import KMeans
-import google.generativeai as genai
+from prompt_analysis.color_extraction import extract_palette
+from prompt_analysis.analysis_cache import AnalysisCache, content_hash
+from prompt_analysis.dedup_index import DedupIndex
+from prompt_analysis.theme_catalogue import get_catalogue
+from prompt_analysis.image_ingest import decode_image, jpeg_part, GEMINI_IMAGE_SIZE
+from prompt_analysis.gemini_client import stream_text
+from prompt_analysis.color_grading import grade_image, lut_to_cube
 import os
 
 # ---- Setup ----
@@ -16,17 +19,99 @@ st.set_page_config(page_title="Moodboard Theme & Design Recommender", layout="wi
 st.markdown("<h1 style='text-align: center;'>Moodboard Theme & Design Recommender</h1>", unsafe_allow_html=True)
 st.markdown("<p style='text-align: center; font-size: 1.1rem;'>AI-powered visual mood and color inspiration based on your text or image input.</p>", unsafe_allow_html=True)
 
+@st.cache_resource
+def get_analysis_cache():
+    # shared by every session; set MOODBOARD_CACHE_DIR to also persist entries to disk
+    return AnalysisCache(max_items=512, disk_dir=os.getenv("MOODBOARD_CACHE_DIR"))
+
+@st.cache_resource(max_entries=16)
+def load_uploaded_image(image_key, _image_bytes):
+    # decoded once per upload near 512px (JPEG draft mode); palette, CLIP and Gemini share this buffer
+    return decode_image(_image_bytes)
+
+@st.cache_resource
+def get_dedup_index():
+    cache_dir = os.getenv("MOODBOARD_CACHE_DIR")
+    return DedupIndex(os.path.join(cache_dir, "phash_index.txt") if cache_dir else None)
+
+@st.cache_resource(max_entries=256)
+def analysis_key(image_key, _image_bytes):
+    # near-duplicates of an earlier upload (re-exports, burst frames) share its cached analyses;
+    # hashed once per upload, reruns reuse the key
+    return get_dedup_index().canonical_key(image_key, load_uploaded_image(image_key, _image_bytes))
+
+def cached_palette(image_bytes, image_key):
+    return analysis_cache.get_or_compute(
+        "palette", content_hash(analysis_key(image_key, image_bytes), "hist", 5),
+        lambda: extract_palette(load_uploaded_image(image_key, image_bytes)),
+    )
+
+@st.cache_resource
+def start_clip_warmup():
+    # CLIP is only loaded by modes that use it; this starts it off the UI thread
+    from prompt_analysis.classify_prompt import warm_up_in_background
+    return warm_up_in_background()
+
+@st.cache_resource
+def get_reference_library():
+    from prompt_analysis.reference_library import ReferenceLibrary
+    return ReferenceLibrary()
+
+@st.cache_resource
+def get_palette_index():
+    from prompt_analysis.palette_index import PaletteIndex
+    return PaletteIndex()
+
+def get_keyword_index():
+    # compiled with the theme catalogue, so it is rebuilt only when theme_map.json changes
+    return get_catalogue().keyword_index
+
+@st.fragment
+def grading_preview(image_key, image_bytes, desired_theme, palette):
+    # a fragment, so moving the grade controls reruns only the preview, never the Gemini critique
+    st.subheader("Grading Preview")
+    theme_names = list(theme_data.keys())
+    typed_theme = desired_theme.strip().lower().replace(" ", "_")
+    if typed_theme not in theme_data:
+        guesses = get_keyword_index().rank(desired_theme, top_k=1)
+        typed_theme = guesses[0]["theme"] if guesses else theme_names[0]
+    grade_theme = st.selectbox("Grade toward the palette of:", theme_names, index=theme_names.index(typed_theme))
+    grade_strength = st.slider("Grade strength", 0.0, 1.0, 0.8, 0.05)
+    # local 3D LUT built from the theme palette, so the preview needs no LLM round trip
+    graded, lut = grade_image(
+        load_uploaded_image(image_key, image_bytes), theme_data[grade_theme]["colors"], grade_strength, palette=palette,
+    )
+    before_col, after_col = st.columns(2)
+    before_col.image(load_uploaded_image(image_key, image_bytes), caption="Original", use_container_width=True)
+    after_col.image(graded, caption=f"Graded toward {grade_theme.replace('_', ' ').title()}", use_container_width=True)
+    st.download_button("Download LUT (.cube)", lut_to_cube(lut, f"{grade_theme} grade"), file_name=f"{grade_theme}.cube")
+
 theme_data = load_theme_data()
-input_mode = st.radio("Choose input type:", ["Text Prompt", "Upload Image", "Color Correction"], horizontal=True)
+analysis_cache = get_analysis_cache()
+if os.getenv("MOODBOARD_WARM_CLIP") == "1":
+    start_clip_warmup()
+input_mode = st.radio("Choose input type:", ["Text Prompt", "Upload Image", "Color Correction", "Reference Library"], horizontal=True)
 
 # ---- TEXT PROMPT MODE ----
 if input_mode == "Text Prompt":
     prompt = st.text_area("Enter a descriptive scene prompt:", height=100, placeholder="e.g., A man walking in a sand-covered battlefield, 1917")
+    blend_clip = st.checkbox("Blend keyword ranking with CLIP similarity")
+    if blend_clip:
+        start_clip_warmup()
+    refine_with_gemini = st.checkbox("Refine the shortlist with Gemini")
 
     if st.button("Analyze Prompt"):
         if prompt.strip():
-            from prompt_analysis.recommend_color import guess_top_themes_with_gemini
-            top_themes = guess_top_themes_with_gemini(prompt, theme_data)
+            # local keyword ranking first; Gemini only reorders the shortlist when asked
+            top_themes = get_keyword_index().rank(prompt, top_k=8 if refine_with_gemini else 3, clip_weight=0.4 if blend_clip else 0.0)
+            if refine_with_gemini:
+                from prompt_analysis.recommend_color import guess_top_themes_with_gemini
+                # no keyword hits: let Gemini choose among every theme rather than give up
+                shortlist = {entry["theme"]: theme_data[entry["theme"]] for entry in top_themes} if top_themes else theme_data
+                top_themes = analysis_cache.get_or_compute(
+                    "prompt_themes", content_hash(prompt.strip(), sorted(shortlist)),
+                    lambda: guess_top_themes_with_gemini(prompt, shortlist) or None,
+                ) or top_themes[:3]
 
             if not top_themes:
                 st.error("Couldn't guess any themes.")
@@ -62,32 +147,35 @@ if input_mode == "Text Prompt":
 elif input_mode == "Upload Image":
     uploaded_file = st.file_uploader("Upload an image to extract colors and predict moodboard themes", type=["jpg", "jpeg", "png"])
 
-    def extract_dominant_colors(image, n_clusters=5):
-        image = image.resize((200, 200))
-        img_np = np.array(image).reshape(-1, 3)
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(img_np)
-        dominant_colors = kmeans.cluster_centers_.astype(int)
-        return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in dominant_colors]
-
     if uploaded_file:
-        image = Image.open(uploaded_file).convert("RGB")
-        st.image(image, caption="Uploaded Image", use_container_width=True)
+        image_bytes = uploaded_file.getvalue()
+        image_key = content_hash(image_bytes)
+        st.image(image_bytes, caption="Uploaded Image", use_container_width=True)
+        refine_colors_with_gemini = st.checkbox("Refine the palette shortlist with Gemini")
 
         if st.button("Analyze Image"):
             with st.spinner("Extracting dominant colors and analyzing..."):
-                extracted_colors = extract_dominant_colors(image)
+                extracted_colors, color_weights = cached_palette(image_bytes, image_key)
 
                 st.subheader("Extracted Dominant Colors")
                 color_strip_html = "".join(
-                    f'<div style="flex:1; height:60px; background-color:{color};"></div>'
-                    for color in extracted_colors
+                    f'<div style="flex:{weight:.3f}; height:60px; background-color:{color};"></div>'
+                    for color, weight in zip(extracted_colors, color_weights)
                 )
                 st.markdown(
                     f'<div style="display:flex; border-radius:8px; overflow:hidden; margin: 1rem 0;">{color_strip_html}</div>',
                     unsafe_allow_html=True
                 )
 
-                top_themes = guess_themes_from_colors(extracted_colors, theme_data)
+                top_themes = None
+                if refine_colors_with_gemini:
+                    # only real Gemini replies are cached; a failed call falls back to the local ranking below
+                    top_themes = analysis_cache.get_or_compute(
+                        "color_themes", content_hash(analysis_key(image_key, image_bytes), "gemini"),
+                        lambda: refine_themes_from_colors(extracted_colors, theme_data, weights=color_weights) or None,
+                    )
+                if not top_themes:
+                    top_themes = guess_themes_from_colors(extracted_colors, theme_data, weights=color_weights)
 
                 if not top_themes:
                     st.error("Couldn't guess any themes from the image.")
@@ -117,6 +205,59 @@ elif input_mode == "Upload Image":
                             )
                         st.divider()
 
+# ---- REFERENCE LIBRARY MODE ----
+elif input_mode == "Reference Library":
+    st.subheader("Reference Library")
+    start_clip_warmup()
+    library = get_reference_library()
+    palette_index = get_palette_index()
+    st.caption(f"{len(library)} stills indexed")
+
+    with st.expander("Add stills from a folder"):
+        folder = st.text_input("Folder of reference stills")
+        if st.button("Ingest Folder") and folder:
+            if not os.path.isdir(folder):
+                st.error("That folder does not exist.")
+            else:
+                ingest_progress = st.progress(0.0)
+                added = library.ingest(folder, progress=lambda done, total: ingest_progress.progress(done / max(total, 1)))
+                palette_index.ingest(folder)
+                st.success(f"Added {added} stills to the library.")
+
+    search_by = st.radio("Search by:", ["Text", "Image", "Image palette", "Theme palette"], horizontal=True)
+    results = []
+    if search_by == "Text":
+        query = st.text_input("Describe the still you're looking for", placeholder="e.g., lone rider on a ridge at dusk")
+        if query.strip():
+            results = library.search_text(query)
+    elif search_by == "Theme palette":
+        target_theme = st.selectbox("Find stills whose palette matches theme:", list(theme_data.keys()))
+        results = palette_index.search_theme(target_theme, theme_data)
+    elif search_by == "Image palette":
+        query_file = st.file_uploader("Upload a still to find matching palettes", type=["jpg", "jpeg", "png"], key="palette_query")
+        if query_file:
+            query_bytes = query_file.getvalue()
+            results = palette_index.search_image(load_uploaded_image(content_hash(query_bytes), query_bytes))
+    else:
+        query_file = st.file_uploader("Upload a still to find similar ones", type=["jpg", "jpeg", "png"], key="library_query")
+        if query_file:
+            query_bytes = query_file.getvalue()
+            from prompt_analysis.classify_prompt import encode_images, model_key
+            query_key = content_hash(query_bytes)
+            query_features = analysis_cache.get_or_compute(
+                "clip_image", content_hash(analysis_key(query_key, query_bytes), model_key()),
+                lambda: encode_images([load_uploaded_image(query_key, query_bytes)])[0],
+            )
+            results = library.search_vector(query_features)
+
+    if results:
+        columns = st.columns(4)
+        for i, result in enumerate(results):
+            with columns[i % 4]:
+                st.image(library.display_path(result["path"]), caption=f"{os.path.basename(result['path'])} · {result['score']:.2f}", use_container_width=True)
+    elif len(library) == 0:
+        st.info("The library is empty. Ingest a folder of stills to start searching.")
+
 # ---- COLOR CORRECTION MODE ----
 else:
     st.subheader("Color Correction Tool")
@@ -124,39 +265,33 @@ else:
     desired_theme = st.text_input("Enter your desired theme (e.g., Noir, Fairytale, Sci-Fi, Festival of Colors)")
 
     if uploaded_file and desired_theme:
-        image = Image.open(uploaded_file).convert("RGB")
-        st.image(image, caption="Uploaded Image", use_container_width=True)
-
-        def extract_dominant_colors(image, n_clusters=5):
-            image = image.resize((200, 200))
-            img_np = np.array(image).reshape(-1, 3)
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(img_np)
-            dominant_colors = kmeans.cluster_centers_.astype(int)
-            return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in dominant_colors]
+        image_bytes = uploaded_file.getvalue()
+        image_key = content_hash(image_bytes)
+        st.image(image_bytes, caption="Uploaded Image", use_container_width=True)
 
-        extracted_colors = extract_dominant_colors(image)
+        extracted_colors, color_weights = cached_palette(image_bytes, image_key)
 
         st.subheader("Extracted Colors from Image")
         color_strip_html = "".join(
-            f'<div style="flex:1; height:60px; background-color:{color};"></div>'
-            for color in extracted_colors
+            f'<div style="flex:{weight:.3f}; height:60px; background-color:{color};"></div>'
+            for color, weight in zip(extracted_colors, color_weights)
         )
         st.markdown(
             f'<div style="display:flex; border-radius:8px; overflow:hidden; margin-bottom:1rem;">{color_strip_html}</div>',
             unsafe_allow_html=True
         )
 
+        grading_preview(image_key, image_bytes, desired_theme, (extracted_colors, color_weights))
+
         st.subheader("Color Analysis")
 
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model = genai.GenerativeModel("models/gemini-2.5-pro")
         prompt = f"""
         The uploaded image contains these dominant colors: {extracted_colors}.
         The user wants the scene to match the theme "{desired_theme}".
 
         1. Analyze how much the current costume and color style fits the desired theme.
         2. Recommend changes in costumes, lighting, background, and color grading to better match the theme.
-        3. Provide a structured breakdown:
+        3. Provide a structured breakdown, starting your reply with it and using a markdown heading per section:
         - Fit Score (0–10)
         - Current Mood
         - Suggested Adjustments
@@ -166,9 +301,21 @@ else:
         """
 
 
-        with st.spinner("Analyzing your theme and image"):
-            response = model.generate_content([prompt, image])
-            st.markdown(response.text)
+        critique_key = content_hash(analysis_key(image_key, image_bytes), desired_theme.strip().lower())
+        analysis = analysis_cache.get("color_correction", critique_key)
+        if analysis is None and st.button("Get Gemini critique"):
+            # sections render as Gemini writes them; the image goes up as a small JPEG
+            image_part = jpeg_part(decode_image(load_uploaded_image(image_key, image_bytes), GEMINI_IMAGE_SIZE))
+            stream = stream_text([prompt, image_part])
+            analysis = st.write_stream(iter(stream))
+            if analysis and stream.complete:
+                analysis_cache.put("color_correction", critique_key, analysis)
+            elif analysis:
+                st.warning("Gemini's reply was cut off. Run the analysis again for the full critique.")
+            else:
+                st.error("Couldn't get an analysis from Gemini. Please try again.")
+        elif analysis is not None:
+            st.markdown(analysis)
 
     elif uploaded_file and not desired_theme:
         st.warning("Please enter a theme name.")